@@ -5,4 +5,16 @@ from __future__ import print_function
 __author__ = "bibow"
 
 __all__ = ["main"]
-from .main import AppCoreEngine, deploy
+
+# Imported first so APP_CORE_ENGINE_PROFILE_COLD_START=1 can time every import.
+from .handlers.profiler import profiler
+
+
+def __getattr__(name):
+    # AppCoreEngine and deploy are loaded on first access, so importing the
+    # package (e.g. to call deploy()) doesn't pull in the models and schema.
+    if name in ("AppCoreEngine", "deploy"):
+        from . import main
+
+        return getattr(main, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
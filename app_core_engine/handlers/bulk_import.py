@@ -0,0 +1,364 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function
+
+__author__ = "bibow"
+
+import codecs
+import csv
+import gzip
+import json
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import pendulum
+from pynamodb.attributes import MapAttribute, UnicodeAttribute, UTCDateTimeAttribute
+
+from .config import Config
+
+IMPORT_CHUNK_SIZE = 500
+IMPORT_WORKERS = 4
+# Failed rows listed in the result; all of them go to error_path when set.
+MAX_REPORTED_ERRORS = 100
+
+
+class AdaptivePacer:
+    """
+    Shared, throttling-aware pacing for the import workers (AIMD).
+    Every throttled BatchWriteItem doubles the pause taken before the next
+    call by any worker; every clean call shrinks it again, so the import
+    settles just under the table's write capacity.
+    """
+
+    def __init__(self, base_delay: float = 0.05, max_delay: float = 5.0) -> None:
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.delay = 0.0
+        self.throttled = 0
+        self._lock = threading.Lock()
+
+    def wait(self) -> None:
+        delay = self.delay
+        if delay > 0:
+            time.sleep(delay)
+
+    def record(self, throttled: bool) -> None:
+        with self._lock:
+            if throttled:
+                self.throttled += 1
+                self.delay = min(self.max_delay, max(self.base_delay, self.delay * 2))
+            elif self.delay > 0:
+                self.delay = self.delay * 0.8 if self.delay > self.base_delay / 2 else 0.0
+
+
+def _get_model_class(model: str) -> Any:
+    if model == "apps":
+        from ..models.app import AppModel
+
+        return AppModel
+    if model == "app_configs":
+        from ..models.app_config import AppConfigModel
+
+        return AppConfigModel
+    if model == "threads":
+        from ..models.thread import ThreadModel
+
+        return ThreadModel
+    raise Exception(f"Unknown import model: {model}")
+
+
+def _open_source(source: str) -> Any:
+    """
+    Open a local path or s3://bucket/key as a streaming binary file,
+    transparently decompressing .gz sources.
+    """
+    if source.startswith("s3://"):
+        bucket, _, key = source[len("s3://") :].partition("/")
+        if not bucket or not key:
+            raise Exception(f"Invalid S3 source: {source}")
+        stream = Config.get_aws_s3().get_object(Bucket=bucket, Key=key)["Body"]
+    else:
+        stream = open(source, "rb")
+    if source.endswith(".gz"):
+        return gzip.GzipFile(fileobj=stream, mode="rb")
+    return stream
+
+
+def _iter_rows(stream: Any, file_format: str) -> Iterator[Any]:
+    """
+    Yield one raw row per record: a dict for CSV, the parsed JSON value for
+    NDJSON (or the exception if the line is not valid JSON).
+    """
+    reader = codecs.getreader("utf-8")(stream)
+    if file_format == "csv":
+        yield from csv.DictReader(reader)
+        return
+    for line in reader:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError as e:
+            yield e
+
+
+def _build_entity(model_class: Any, row: Any, now: Any) -> Any:
+    """
+    Validate one row against the model schema and return the model instance.
+    CSV cells are strings, so map attributes are read as JSON and datetimes as
+    ISO 8601; missing created_at/updated_at default to the import time.
+    """
+    if isinstance(row, Exception):
+        raise Exception(f"Invalid JSON: {row}")
+    if not isinstance(row, dict):
+        raise Exception("Row is not an object.")
+
+    attributes = model_class.get_attributes()
+    unknown = [name for name in row if name not in attributes]
+    if unknown:
+        raise Exception(f"Unknown attributes: {', '.join(sorted(unknown))}.")
+
+    values = {}
+    for name, attribute in attributes.items():
+        value = row.get(name)
+        if value == "":
+            value = None
+        if value is None:
+            if name in ("created_at", "updated_at"):
+                values[name] = now
+            continue
+
+        if isinstance(attribute, UTCDateTimeAttribute):
+            value = pendulum.parse(value) if isinstance(value, str) else value
+        elif isinstance(attribute, MapAttribute):
+            value = json.loads(value) if isinstance(value, str) else value
+            if not isinstance(value, dict):
+                raise Exception(f"{name} must be an object.")
+        elif isinstance(attribute, UnicodeAttribute) and not isinstance(value, str):
+            raise Exception(f"{name} must be a string.")
+        values[name] = value
+
+    keys = [model_class._hash_key_attribute().attr_name]
+    if model_class._range_key_attribute() is not None:
+        keys.append(model_class._range_key_attribute().attr_name)
+    for key in keys:
+        if values.get(key) is None:
+            raise Exception(f"Missing key attribute {key}.")
+
+    entity = model_class(*[values.pop(key) for key in keys], **values)
+    # Raises for missing non-null attributes, before anything is written.
+    entity.serialize()
+    return entity
+
+
+class _Checkpoint:
+    """
+    Tracks the contiguous prefix of rows that are fully processed, so chunks
+    finishing out of order never move the resume point past an unfinished one.
+    """
+
+    def __init__(self, path: Optional[str], source: str, model: str) -> None:
+        self.path = path
+        self.source = source
+        self.model = model
+        self.rows = 0
+        self.written = 0
+        self.failed = 0
+        self.done = {}
+
+    def load(self) -> int:
+        if not self.path or not os.path.exists(self.path):
+            return 0
+        with open(self.path) as checkpoint:
+            state = json.load(checkpoint)
+        if state.get("source") != self.source or state.get("model") != self.model:
+            raise Exception(
+                f"Checkpoint {self.path} belongs to {state.get('model')} from "
+                f"{state.get('source')}."
+            )
+        self.rows = state["rows"]
+        self.written = state.get("written", 0)
+        self.failed = state.get("failed", 0)
+        return self.rows
+
+    def complete(self, start: int, end: int, written: int, failed: int) -> None:
+        self.done[start] = (end, written, failed)
+        advanced = False
+        while self.rows in self.done:
+            end, written, failed = self.done.pop(self.rows)
+            self.rows = end
+            self.written += written
+            self.failed += failed
+            advanced = True
+        if advanced:
+            self.save()
+
+    def save(self) -> None:
+        if not self.path:
+            return
+        temp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(temp_path, "w") as checkpoint:
+            json.dump(
+                {
+                    "source": self.source,
+                    "model": self.model,
+                    "rows": self.rows,
+                    "written": self.written,
+                    "failed": self.failed,
+                    "updated_at": pendulum.now("UTC").isoformat(),
+                },
+                checkpoint,
+            )
+        os.replace(temp_path, self.path)
+
+
+def import_rows(
+    model: str,
+    source: str,
+    file_format: Optional[str] = None,
+    checkpoint_path: Optional[str] = None,
+    error_path: Optional[str] = None,
+    chunk_size: int = IMPORT_CHUNK_SIZE,
+    workers: int = IMPORT_WORKERS,
+    logger: Any = None,
+) -> Dict[str, Any]:
+    """
+    Stream rows from NDJSON or CSV into a model's table with BatchWriteItem.
+    Rows are validated as they are read and written in chunks by a worker
+    pool; at most two chunks per worker are in memory at once. Rows replace
+    existing items with the same key, so re-running after a crash is safe:
+    with checkpoint_path set, the run resumes after the last row prefix that
+    was fully written.
+    Args:
+        model (str): "apps", "app_configs" or "threads".
+        source (str): A local path or s3://bucket/key, optionally .gz.
+        file_format (str): "ndjson" or "csv"; guessed from the extension.
+        checkpoint_path (str): Optional resume file, updated as chunks finish.
+        error_path (str): Optional NDJSON file receiving every rejected row.
+        chunk_size (int): Rows per worker task.
+        workers (int): Concurrent writers.
+    Returns:
+        Dict with the rows read, written, skipped and failed, and the first errors.
+    """
+    from ..models.counter import Counters, counter_keys, invalidate_counters
+    from ..models.utils import _batch_write
+
+    model_class = _get_model_class(model)
+    if file_format is None:
+        name = source[: -len(".gz")] if source.endswith(".gz") else source
+        file_format = "csv" if name.endswith(".csv") else "ndjson"
+    if file_format not in ("ndjson", "csv"):
+        raise Exception(f"Unsupported import format: {file_format}")
+
+    checkpoint = _Checkpoint(checkpoint_path, source, model)
+    skip = checkpoint.load()
+    pacer = AdaptivePacer()
+    errors, errors_lock = [], threading.Lock()
+    error_file = open(error_path, "a") if error_path else None
+    now = pendulum.now("UTC")
+    start_time = time.perf_counter()
+
+    def report(failures: List[Tuple[int, Any, str]]) -> None:
+        with errors_lock:
+            for row_number, row, error in failures:
+                if len(errors) < MAX_REPORTED_ERRORS:
+                    errors.append({"row": row_number, "error": error})
+                if error_file is not None:
+                    error_file.write(
+                        json.dumps(
+                            {
+                                "row": row_number,
+                                "error": error,
+                                "data": row if not isinstance(row, Exception) else None,
+                            },
+                            default=str,
+                        )
+                        + "\n"
+                    )
+
+    def process(start: int, rows: List[Any]) -> Tuple[int, int, int, int]:
+        entities, positions, failures = [], [], []
+        for offset, row in enumerate(rows):
+            try:
+                entities.append(_build_entity(model_class, row, now))
+                positions.append(offset)
+            except Exception as e:
+                failures.append((start + offset + 1, row, str(e)))
+
+        write_errors = _batch_write(model_class, entities, pacer=pacer) if entities else []
+        keys = set()
+        for offset, entity, error in zip(positions, entities, write_errors):
+            if error is not None:
+                failures.append((start + offset + 1, rows[offset], error))
+            elif model in ("apps", "threads"):
+                keys.update(counter_keys(model, entity))
+        # Rows may overwrite items, so the counters they touch are recounted.
+        # This happens before the chunk is checkpointed, so a resumed import
+        # never skips the invalidation of rows written before a crash.
+        if keys and Counters.enabled:
+            invalidate_counters(keys)
+        if failures:
+            report(failures)
+        return start, start + len(rows), len(rows) - len(failures), len(failures)
+
+    read = 0
+    pending = set()
+    stream = _open_source(source)
+    try:
+        with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+
+            def drain(limit: int) -> None:
+                nonlocal pending
+                while len(pending) > limit:
+                    finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        checkpoint.complete(*future.result())
+
+            chunk, chunk_start = [], skip
+            for row in _iter_rows(stream, file_format):
+                read += 1
+                if read <= skip:
+                    continue
+                chunk.append(row)
+                if len(chunk) >= chunk_size:
+                    pending.add(executor.submit(process, chunk_start, chunk))
+                    chunk_start += len(chunk)
+                    chunk = []
+                    drain(max(workers, 1) * 2)
+            if chunk:
+                pending.add(executor.submit(process, chunk_start, chunk))
+            drain(0)
+    finally:
+        stream.close()
+        if error_file is not None:
+            error_file.close()
+
+    if model == "app_configs":
+        from ..models.utils import app_config_cache
+
+        app_config_cache.clear()
+    elif model == "apps":
+        from ..models.utils import installed_app_cache
+
+        installed_app_cache.clear()
+
+    result = {
+        "model": model,
+        "source": source,
+        "rows": read,
+        "skipped": skip,
+        "written": checkpoint.written,
+        "failed": checkpoint.failed,
+        "throttled": pacer.throttled,
+        "errors": errors,
+        "seconds": round(time.perf_counter() - start_time, 3),
+    }
+    if logger is not None:
+        logger.info(
+            f"Imported {result['written']} {model} from {source} "
+            f"({result['failed']} failed, {skip} skipped) in {result['seconds']}s."
+        )
+    return result
@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function
+
+__author__ = "bibow"
+
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional
+
+# Returned by TTLCache.get when the key is absent or expired, so that None can
+# be cached as a value.
+MISSING = object()
+
+
+class _Flight:
+    def __init__(self) -> None:
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+        # Set when the key is invalidated while loading; the result is then
+        # returned to the waiting callers but not cached.
+        self.stale = False
+
+
+class TTLCache:
+    """
+    Thread-safe, bounded LRU cache with a per-entry time to live.
+    Lives at module level so entries survive across warm Lambda invocations.
+    None values (negative results) expire after negative_ttl when it is set.
+    """
+
+    def __init__(
+        self, max_size: int = 256, ttl: float = 300.0, negative_ttl: Optional[float] = None
+    ) -> None:
+        self.max_size = max_size
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.loads = 0
+        self._in_flight = {}
+        self._lock = threading.RLock()
+
+    def configure(
+        self,
+        max_size: Optional[int] = None,
+        ttl: Optional[float] = None,
+        negative_ttl: Optional[float] = None,
+    ) -> None:
+        with self._lock:
+            if max_size is not None:
+                self.max_size = int(max_size)
+            if ttl is not None:
+                self.ttl = float(ttl)
+            if negative_ttl is not None:
+                self.negative_ttl = float(negative_ttl)
+            self._evict()
+
+    def get(self, key: Hashable, default: Any = MISSING) -> Any:
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is None or entry[0] <= time.monotonic():
+                if entry is not None:
+                    del self.entries[key]
+                self.misses += 1
+                return default
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        if self.max_size <= 0:
+            return
+        if ttl is None:
+            ttl = self.negative_ttl if value is None and self.negative_ttl is not None else self.ttl
+        with self._lock:
+            expires_at = time.monotonic() + ttl
+            self.entries[key] = (expires_at, value)
+            self.entries.move_to_end(key)
+            self._evict()
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        """
+        Return the cached value, or call loader() once for concurrent misses
+        on the same key; the other callers wait for and share its result.
+        """
+        return self.get_or_load_many([key], lambda keys: {key: loader()})[key]
+
+    def get_or_load_many(
+        self, keys: Iterable[Hashable], loader: Callable[[List[Hashable]], Dict[Hashable, Any]]
+    ) -> Dict[Hashable, Any]:
+        """
+        Batch get_or_load: loader(missing_keys) is called once for the keys
+        that are neither cached nor being loaded by another caller, and
+        returns the values it found; keys it leaves out load as None. A key
+        invalidated while its load is in flight is returned but not cached.
+        """
+        results = {}
+        for key in keys:
+            value = self.get(key)
+            if value is not MISSING:
+                results[key] = value
+
+        led, followed = {}, {}
+        with self._lock:
+            for key in keys:
+                if key in results or key in led:
+                    continue
+                flight = self._in_flight.get(key)
+                if flight is None:
+                    led[key] = self._in_flight[key] = _Flight()
+                else:
+                    followed[key] = flight
+
+        if led:
+            try:
+                values = loader(list(led))
+                with self._lock:
+                    for key, flight in led.items():
+                        flight.value = values.get(key)
+                        if not flight.stale:
+                            self.set(key, flight.value)
+                    self.loads += len(led)
+            except Exception as e:
+                for flight in led.values():
+                    flight.error = e
+                raise e
+            finally:
+                with self._lock:
+                    for key in led:
+                        self._in_flight.pop(key, None)
+                for flight in led.values():
+                    flight.event.set()
+            results.update((key, flight.value) for key, flight in led.items())
+
+        for key, flight in followed.items():
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            results[key] = flight.value
+        return results
+
+    def invalidate(self, key: Hashable) -> None:
+        with self._lock:
+            self.entries.pop(key, None)
+            flight = self._in_flight.get(key)
+            if flight is not None:
+                flight.stale = True
+
+    def clear(self) -> None:
+        with self._lock:
+            self.entries.clear()
+            for flight in self._in_flight.values():
+                flight.stale = True
+
+    def _evict(self) -> None:
+        while len(self.entries) > max(self.max_size, 0):
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def get_stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "size": len(self.entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "loads": self.loads,
+            }
+
+    def save_snapshot(self, path: str) -> None:
+        """
+        Write the live entries to a JSON file with wall-clock expiry times.
+        Keys and values must be JSON serializable.
+        """
+        now_monotonic, now = time.monotonic(), time.time()
+        with self._lock:
+            entries = [
+                [key, now + expires_at - now_monotonic, value]
+                for key, (expires_at, value) in self.entries.items()
+                if expires_at > now_monotonic
+            ]
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, "w") as snapshot:
+            json.dump(entries, snapshot)
+        os.replace(temp_path, path)
+
+    def load_snapshot(self, path: str) -> int:
+        """
+        Load unexpired entries written by save_snapshot; returns how many.
+        """
+        if not os.path.exists(path):
+            return 0
+        with open(path) as snapshot:
+            entries = json.load(snapshot)
+
+        now = time.time()
+        loaded = 0
+        for key, expires_at, value in entries:
+            if expires_at <= now:
+                continue
+            key = tuple(key) if isinstance(key, list) else key
+            self.set(key, value, ttl=min(expires_at - now, self.ttl))
+            loaded += 1
+        return loaded
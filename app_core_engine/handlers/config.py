@@ -4,13 +4,16 @@ from __future__ import print_function
 __author__ = "bibow"
 
 import logging
+import threading
 from typing import Any, Dict
 
-import boto3
-
 from silvaengine_utility import Graphql
 
-from ..models import utils
+from .cache import TTLCache
+from .executor import AsyncExecution
+from .instrumentation import Instrumentation
+from .persisted_queries import PersistedQueries
+from .profiler import profiler
 
 
 class Config:
@@ -21,9 +24,22 @@ class Config:
 
     aws_lambda = None
     aws_sqs = None
+    aws_s3 = None
+    s3_endpoint_url = None
     task_queue = None
+    task_queue_name = None
     apigw_client = None
+    aws_credentials = {}
+    aws_max_pool_connections = 10
+    _aws_session = None
+    _aws_lock = threading.Lock()
+    # GraphQL schemas keyed by function name; entries set here are used as is
+    # and never fetched or expired.
     schemas = {}
+    # GraphQL schemas fetched from other functions, keyed by function name.
+    _schema_cache = TTLCache(max_size=64, ttl=3600.0)
+    schema_snapshot_path = None
+    graphql_document_cache_size = 128
 
     @classmethod
     def initialize(cls, logger: logging.Logger, **setting: Dict[str, Any]) -> None:
@@ -34,12 +50,15 @@ class Config:
             **setting (Dict[str, Any]): Configuration dictionary.
         """
         try:
-            cls._set_parameters(setting)
-            cls._initialize_aws_services(setting)
-            cls._initialize_task_queue(setting)
-            # cls._initialize_apigw_client(setting)
-            if setting.get("test_mode") == "local_for_all":
-                cls._initialize_tables(logger)
+            with profiler.phase("Config.initialize"):
+                cls._set_parameters(setting)
+                cls._initialize_aws_services(setting)
+                cls._initialize_task_queue(setting)
+                cls._load_schema_snapshot(logger)
+                cls._load_persisted_queries(logger)
+                # cls._initialize_apigw_client(setting)
+                if setting.get("test_mode") == "local_for_all":
+                    cls._initialize_tables(logger)
             logger.info("Configuration initialized successfully.")
         except Exception as e:
             logger.exception("Failed to initialize configuration.")
@@ -52,12 +71,41 @@ class Config:
         Args:
             setting (Dict[str, Any]): Configuration dictionary.
         """
-        pass
+        # The models, pynamodb, botocore and tenacity are only loaded once the
+        # engine is initialized, never when main is imported.
+        from ..models import utils
+        from ..models.counter import Counters
+        from ..models.query_plan import QueryPlanner
+        from .retry_policy import RetryPolicy
+
+        cls.graphql_document_cache_size = int(
+            setting.get("graphql_document_cache_size", cls.graphql_document_cache_size)
+        )
+        RetryPolicy.configure(setting)
+        Instrumentation.configure(setting)
+        AsyncExecution.configure(setting)
+        Counters.configure(setting)
+        QueryPlanner.configure(setting)
+        PersistedQueries.configure(setting)
+        utils.app_config_cache.configure(
+            max_size=setting.get("app_config_cache_max_size"),
+            ttl=setting.get("app_config_cache_ttl"),
+        )
+        utils.installed_app_cache.configure(
+            max_size=setting.get("installed_app_cache_max_size"),
+            ttl=setting.get("installed_app_cache_ttl"),
+            negative_ttl=setting.get("installed_app_cache_negative_ttl"),
+        )
+        cls._schema_cache.configure(
+            max_size=setting.get("graphql_schema_cache_max_size"),
+            ttl=setting.get("graphql_schema_cache_ttl"),
+        )
+        cls.schema_snapshot_path = setting.get("graphql_schema_snapshot_path")
 
     @classmethod
     def _initialize_aws_services(cls, setting: Dict[str, Any]) -> None:
         """
-        Initialize AWS services, such as the S3 client.
+        Record AWS credentials; the clients are created on first use.
         Args:
             setting (Dict[str, Any]): Configuration dictionary.
         """
@@ -73,20 +121,101 @@ class Config:
         else:
             aws_credentials = {}
 
-        cls.aws_lambda = boto3.client("lambda", **aws_credentials)
-        cls.aws_sqs = boto3.resource("sqs", **aws_credentials)
+        with cls._aws_lock:
+            cls.aws_credentials = aws_credentials
+            cls.aws_max_pool_connections = int(
+                setting.get("aws_max_pool_connections", cls.aws_max_pool_connections)
+            )
+            # Set for S3-compatible stores (MinIO, LocalStack, ...).
+            cls.s3_endpoint_url = setting.get("s3_endpoint_url")
+            cls._aws_session = None
+            cls.aws_lambda = None
+            cls.aws_sqs = None
+            cls.aws_s3 = None
 
     @classmethod
     def _initialize_task_queue(cls, setting: Dict[str, Any]) -> None:
         """
-        Initialize SQS task queue if task_queue_name is provided in settings.
+        Record the SQS task queue name; the queue is looked up on first use.
         Args:
             setting (Dict[str, Any]): Configuration dictionary containing task queue settings.
         """
-        if "task_queue_name" in setting:
-            cls.task_queue = cls.aws_sqs.get_queue_by_name(
-                QueueName=setting["task_queue_name"]
-            )
+        with cls._aws_lock:
+            cls.task_queue_name = setting.get("task_queue_name")
+            cls.task_queue = None
+
+    @classmethod
+    def _get_aws_session(cls) -> Any:
+        # Caller holds cls._aws_lock; boto3 session creation isn't thread safe.
+        if cls._aws_session is None:
+            import boto3
+
+            cls._aws_session = boto3.session.Session(**cls.aws_credentials)
+        return cls._aws_session
+
+    @classmethod
+    def _get_botocore_config(cls) -> Any:
+        from botocore.config import Config as BotocoreConfig
+
+        return BotocoreConfig(
+            max_pool_connections=cls.aws_max_pool_connections,
+            retries={"mode": "standard"},
+        )
+
+    @classmethod
+    def get_aws_lambda(cls) -> Any:
+        """
+        Return the shared Lambda client, creating it on first use.
+        """
+        if cls.aws_lambda is None:
+            with cls._aws_lock:
+                if cls.aws_lambda is None:
+                    cls.aws_lambda = cls._get_aws_session().client(
+                        "lambda", config=cls._get_botocore_config()
+                    )
+        return cls.aws_lambda
+
+    @classmethod
+    def get_aws_sqs(cls) -> Any:
+        """
+        Return the shared SQS resource, creating it on first use.
+        """
+        if cls.aws_sqs is None:
+            with cls._aws_lock:
+                if cls.aws_sqs is None:
+                    cls.aws_sqs = cls._get_aws_session().resource(
+                        "sqs", config=cls._get_botocore_config()
+                    )
+        return cls.aws_sqs
+
+    @classmethod
+    def get_aws_s3(cls) -> Any:
+        """
+        Return the shared S3 client, creating it on first use.
+        """
+        if cls.aws_s3 is None:
+            with cls._aws_lock:
+                if cls.aws_s3 is None:
+                    cls.aws_s3 = cls._get_aws_session().client(
+                        "s3",
+                        endpoint_url=cls.s3_endpoint_url,
+                        config=cls._get_botocore_config(),
+                    )
+        return cls.aws_s3
+
+    @classmethod
+    def get_task_queue(cls) -> Any:
+        """
+        Return the SQS task queue, or None if task_queue_name is not set.
+        """
+        if cls.task_queue is None and cls.task_queue_name:
+            aws_sqs = cls.get_aws_sqs()
+            with cls._aws_lock:
+                if cls.task_queue is None:
+                    cls.task_queue = aws_sqs.get_queue_by_name(
+                        QueueName=cls.task_queue_name
+                    )
+        return cls.task_queue
 
     @classmethod
     def _initialize_tables(cls, logger: logging.Logger) -> None:
@@ -94,8 +223,41 @@ class Config:
         Initialize database tables by calling the utils._initialize_tables() method.
         This is an internal method used during configuration setup.
         """
+        from ..models import utils
+
         utils._initialize_tables(logger)
 
+    @classmethod
+    def _load_schema_snapshot(cls, logger: logging.Logger) -> None:
+        """
+        Warm the GraphQL schema cache from the on-disk snapshot, if configured.
+        A missing or unreadable snapshot only costs the remote fetches.
+        """
+        if not cls.schema_snapshot_path:
+            return
+        try:
+            loaded = cls._schema_cache.load_snapshot(cls.schema_snapshot_path)
+            logger.info(f"Loaded {loaded} GraphQL schemas from snapshot.")
+        except Exception:
+            logger.warning("Failed to load the GraphQL schema snapshot.", exc_info=True)
+
+    @classmethod
+    def _load_persisted_queries(cls, logger: logging.Logger) -> None:
+        """
+        Load the persisted query allow-list, if configured. With
+        persisted_queries_only set, a failure stops the initialization, since
+        no request could be served without it.
+        """
+        if not PersistedQueries.enabled or not PersistedQueries.allow_list_path:
+            return
+        try:
+            loaded = PersistedQueries.load_allow_list(PersistedQueries.allow_list_path)
+            logger.info(f"Loaded {loaded} persisted queries.")
+        except Exception as e:
+            if PersistedQueries.only:
+                raise e
+            logger.warning("Failed to load the persisted query allow-list.", exc_info=True)
+
     # Fetches and caches GraphQL schema for a given function
     @classmethod
     def fetch_graphql_schema(
@@ -105,21 +267,39 @@ class Config:
     ) -> Dict[str, Any]:
         """
         Fetches and caches a GraphQL schema for a given function.
+        Entries expire after graphql_schema_cache_ttl, concurrent misses for the
+        same function share one fetch, and fresh fetches are written to
+        graphql_schema_snapshot_path when it is set. A schema set in
+        Config.schemas is returned as is.
 
         Args:
-            logger: Logger instance for error reporting
-            endpoint_id: ID of the endpoint to fetch schema from
+            context: Request context passed to the remote function
             function_name: Name of function to get schema for
-            setting: Optional settings dictionary
 
         Returns:
             Dict containing the GraphQL schema
         """
-        # Check if schema exists in cache, if not fetch and store it
-        if Config.schemas.get(function_name) is None:
-            Config.schemas[function_name] = Graphql.fetch_graphql_schema(
+        if function_name in Config.schemas:
+            return Config.schemas[function_name]
+
+        fetched = []
+
+        def _fetch() -> Dict[str, Any]:
+            fetched.append(function_name)
+            return Graphql.fetch_graphql_schema(
                 context=context,
                 funct=function_name,
-                aws_lambda=Config.aws_lambda
+                aws_lambda=Config.get_aws_lambda()
             )
-        return Config.schemas[function_name]
+
+        schema = Config._schema_cache.get_or_load(function_name, _fetch)
+        if fetched and Config.schema_snapshot_path:
+            try:
+                Config._schema_cache.save_snapshot(Config.schema_snapshot_path)
+            except Exception:
+                logger = context.get("logger") if isinstance(context, dict) else None
+                if logger:
+                    logger.warning(
+                        "Failed to write the GraphQL schema snapshot.", exc_info=True
+                    )
+        return schema
@@ -0,0 +1,293 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function
+
+__author__ = "bibow"
+
+import asyncio
+import contextvars
+import functools
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from inspect import isawaitable
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+from graphene import Schema
+from graphene.types.schema import normalize_execute_kwargs
+from graphene.utils.str_converters import to_camel_case
+from graphql import (
+    DocumentNode,
+    ExecutionResult,
+    GraphQLError,
+    execute,
+    parse,
+    validate,
+)
+
+from .instrumentation import Instrumentation, ResolverMiddleware
+from .persisted_queries import PersistedQueries
+
+
+class AsyncExecution:
+    """
+    Optional concurrent execution of the root query fields.
+    pynamodb is synchronous, so each root field is offloaded to a shared thread
+    pool and graphql-core awaits them together: a query asking for app,
+    appConfig and threadList costs about its slowest field instead of the sum.
+    Mutations still run one after another, as the GraphQL spec requires.
+    """
+
+    enabled = False
+    max_workers = 8
+    _executor = None
+    _lock = threading.Lock()
+    _local = threading.local()
+
+    @classmethod
+    def configure(cls, setting: Dict[str, Any]) -> None:
+        """
+        Apply async execution settings.
+        Args:
+            setting (Dict[str, Any]): Configuration dictionary.
+        """
+        cls.enabled = bool(setting.get("graphql_async_enabled", cls.enabled))
+        max_workers = int(setting.get("graphql_async_max_workers", cls.max_workers))
+        with cls._lock:
+            if max_workers != cls.max_workers and cls._executor is not None:
+                cls._executor.shutdown(wait=False)
+                cls._executor = None
+            cls.max_workers = max_workers
+
+    @classmethod
+    def get_executor(cls) -> ThreadPoolExecutor:
+        if cls._executor is None:
+            with cls._lock:
+                if cls._executor is None:
+                    cls._executor = ThreadPoolExecutor(
+                        max_workers=cls.max_workers,
+                        thread_name_prefix="app-core-engine-resolver",
+                    )
+        return cls._executor
+
+    @classmethod
+    def run(cls, awaitable: Awaitable[Any]) -> Any:
+        """
+        Run the awaitable returned by graphql-core to completion on this
+        thread's event loop, or on a helper thread if a loop is already running.
+        """
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            loop = getattr(cls._local, "loop", None)
+            if loop is None or loop.is_closed():
+                loop = cls._local.loop = asyncio.new_event_loop()
+            return loop.run_until_complete(awaitable)
+
+        result = {}
+
+        def _run() -> None:
+            try:
+                result["value"] = asyncio.run(awaitable)
+            except BaseException as e:
+                result["error"] = e
+
+        thread = threading.Thread(target=_run)
+        thread.start()
+        thread.join()
+        if "error" in result:
+            raise result["error"]
+        return result["value"]
+
+
+class AsyncOffloadMiddleware:
+    """
+    graphql-core middleware that runs each root field resolver on the
+    AsyncExecution pool. The request's context variables (instrumentation)
+    are copied into the worker.
+    """
+
+    def resolve(self, next_: Callable[..., Any], root: Any, info: Any, **kwargs: Any) -> Any:
+        if root is not None:
+            return next_(root, info, **kwargs)
+
+        context = contextvars.copy_context()
+        funct = functools.partial(context.run, next_, root, info, **kwargs)
+
+        async def offload() -> Any:
+            result = await asyncio.get_running_loop().run_in_executor(
+                AsyncExecution.get_executor(), funct
+            )
+            if isawaitable(result):
+                result = await result
+            return result
+
+        return offload()
+
+
+class CachedSchema:
+    """
+    Process-level wrapper around the graphene Schema.
+    Keeps a bounded LRU of parsed and validated documents keyed by the request
+    text, so repeated operations skip parsing and validation on warm invocations.
+    Precompiled documents (the persisted query allow-list) are never evicted.
+    """
+
+    def __init__(self, schema: Schema, document_cache_size: int = 128) -> None:
+        self.schema = schema
+        self.document_cache_size = document_cache_size
+        self.documents = OrderedDict()
+        self.precompiled = {}
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name: str) -> Any:
+        # Anything we don't override (introspection, printing, ...) goes to graphene.
+        return getattr(self.schema, name)
+
+    def get_document(
+        self, request_string: str
+    ) -> Tuple[Optional[DocumentNode], List[GraphQLError]]:
+        """
+        Return the parsed document for the request text and its validation errors.
+        Only valid documents are cached.
+        Args:
+            request_string (str): GraphQL document text.
+        Returns:
+            Tuple of the document (None on parse failure) and the list of errors.
+        """
+        document = self.precompiled.get(request_string)
+        if document is not None:
+            return document, []
+
+        if self.document_cache_size > 0:
+            with self._lock:
+                document = self.documents.get(request_string)
+                if document is not None:
+                    self.documents.move_to_end(request_string)
+                    return document, []
+
+        try:
+            document = parse(request_string)
+        except GraphQLError as error:
+            return None, [error]
+
+        errors = validate(self.schema.graphql_schema, document)
+        if errors:
+            return document, errors
+
+        if self.document_cache_size > 0:
+            with self._lock:
+                self.documents[request_string] = document
+                self.documents.move_to_end(request_string)
+                while len(self.documents) > self.document_cache_size:
+                    self.documents.popitem(last=False)
+        return document, []
+
+    def precompile(self, queries: Iterable[str]) -> int:
+        """
+        Parse and validate documents ahead of their first request and keep
+        them for the life of the process. Invalid documents are skipped and
+        report their errors when executed.
+        Returns:
+            The number of documents precompiled.
+        """
+        precompiled = dict(self.precompiled)
+        for query in queries:
+            if query in precompiled:
+                continue
+            try:
+                document = parse(query)
+            except GraphQLError:
+                continue
+            if not validate(self.schema.graphql_schema, document):
+                precompiled[query] = document
+        self.precompiled = precompiled
+        return len(precompiled)
+
+    def execute(self, request_string: Any = None, **kwargs: Dict[str, Any]) -> ExecutionResult:
+        """
+        Drop-in replacement for graphene's Schema.execute using the document cache.
+        """
+        kwargs = normalize_execute_kwargs(kwargs)
+        if PersistedQueries.enabled and not isinstance(request_string, DocumentNode):
+            request_string, errors = PersistedQueries.resolve(request_string)
+            if errors:
+                return ExecutionResult(data=None, errors=errors)
+
+        if not isinstance(request_string, str):
+            # Pre-parsed documents are handed straight to graphene.
+            return self.schema.execute(request_string, **kwargs)
+
+        document, errors = self.get_document(request_string)
+        if errors:
+            return ExecutionResult(data=None, errors=errors)
+        if PersistedQueries.enabled:
+            PersistedQueries.register_current()
+
+        result = execute(
+            self.schema.graphql_schema,
+            document,
+            root_value=kwargs.get("root_value"),
+            context_value=kwargs.get("context_value"),
+            variable_values=kwargs.get("variable_values"),
+            operation_name=kwargs.get("operation_name"),
+            middleware=kwargs.get("middleware") or self._get_middleware(),
+        )
+        if isawaitable(result):
+            result = AsyncExecution.run(result)
+
+        # Query plans recorded by the list resolvers (see models/query_plan.py).
+        context = kwargs.get("context_value")
+        if isinstance(context, dict) and context.get("query_plans"):
+            result.extensions = dict(
+                result.extensions or {},
+                queryPlans=[
+                    {to_camel_case(key): value for key, value in plan.items()}
+                    for plan in context["query_plans"]
+                ],
+            )
+        return result
+
+    def _get_middleware(self) -> Optional[List[Any]]:
+        # graphql-core makes the last middleware the outermost one; the offload
+        # must wrap the instrumentation so spans are timed inside the worker.
+        middleware = []
+        if Instrumentation.enabled:
+            middleware.append(ResolverMiddleware())
+        if AsyncExecution.enabled:
+            middleware.append(AsyncOffloadMiddleware())
+        return middleware or None
+
+    def clear(self) -> None:
+        with self._lock:
+            self.documents.clear()
+
+
+_cached_schema = None
+_cached_schema_lock = threading.Lock()
+
+
+def get_cached_schema(
+    build_funct: Callable[[], Schema], document_cache_size: int = 128
+) -> CachedSchema:
+    """
+    Return the process-wide CachedSchema, building the graphene Schema on first use.
+    Args:
+        build_funct (Callable): Builds the graphene Schema.
+        document_cache_size (int): Maximum cached documents, 0 disables the cache.
+    """
+    global _cached_schema
+    if _cached_schema is None:
+        with _cached_schema_lock:
+            if _cached_schema is None:
+                _cached_schema = CachedSchema(
+                    build_funct(), document_cache_size=document_cache_size
+                )
+                if PersistedQueries.enabled:
+                    _cached_schema.precompile(PersistedQueries.allow_list.values())
+    return _cached_schema
+
+
+def reset_cached_schema() -> None:
+    global _cached_schema
+    with _cached_schema_lock:
+        _cached_schema = None
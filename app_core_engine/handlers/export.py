@@ -0,0 +1,304 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function
+
+__author__ = "bibow"
+
+import functools
+import gzip
+import io
+import json
+import os
+import queue
+import threading
+import time
+from datetime import date, datetime
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from .config import Config
+
+# Rows buffered between the scan workers and the writer; bounds memory use.
+EXPORT_QUEUE_SIZE = 10000
+EXPORT_PAGE_SIZE = 1000
+# S3 requires at least 5 MiB for every part but the last.
+S3_PART_SIZE = 8 * 1024 * 1024
+
+_DONE = object()
+
+
+def _json_default(o: Any) -> Any:
+    if isinstance(o, (datetime, date)):
+        return o.isoformat()
+    raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
+
+
+class _S3MultipartWriter(io.RawIOBase):
+    """
+    Write-only file object that streams to S3 as a multipart upload, holding
+    at most one part in memory. The upload is aborted if the writer is closed
+    after a failure.
+    """
+
+    def __init__(self, client: Any, bucket: str, key: str, part_size: int = S3_PART_SIZE) -> None:
+        self.client = client
+        self.bucket = bucket
+        self.key = key
+        self.part_size = part_size
+        self.buffer = bytearray()
+        self.parts = []
+        self.failed = False
+        self.bytes_written = 0
+        self.upload_id = client.create_multipart_upload(
+            Bucket=bucket, Key=key, ContentType="application/x-ndjson", ContentEncoding="gzip"
+        )["UploadId"]
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data: Any) -> int:
+        self.buffer.extend(data)
+        self.bytes_written += len(data)
+        while len(self.buffer) >= self.part_size:
+            self._upload_part(bytes(self.buffer[: self.part_size]))
+            del self.buffer[: self.part_size]
+        return len(data)
+
+    def _upload_part(self, body: bytes) -> None:
+        part_number = len(self.parts) + 1
+        response = self.client.upload_part(
+            Bucket=self.bucket,
+            Key=self.key,
+            UploadId=self.upload_id,
+            PartNumber=part_number,
+            Body=body,
+        )
+        self.parts.append({"ETag": response["ETag"], "PartNumber": part_number})
+
+    def abort(self) -> None:
+        self.failed = True
+        self.close()
+
+    def close(self) -> None:
+        if self.closed:
+            return
+        try:
+            if self.failed:
+                self.client.abort_multipart_upload(
+                    Bucket=self.bucket, Key=self.key, UploadId=self.upload_id
+                )
+                return
+            if self.buffer or not self.parts:
+                self._upload_part(bytes(self.buffer))
+                self.buffer.clear()
+            self.client.complete_multipart_upload(
+                Bucket=self.bucket,
+                Key=self.key,
+                UploadId=self.upload_id,
+                MultipartUpload={"Parts": self.parts},
+            )
+        finally:
+            super().close()
+
+
+class _FileWriter(io.FileIO):
+    """
+    Local file sink; writes to a temporary file that replaces the target only
+    when the export completes.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        self.failed = False
+        self.bytes_written = 0
+        super().__init__(self.temp_path, "wb")
+
+    def write(self, data: Any) -> int:
+        written = super().write(data)
+        self.bytes_written += written
+        return written
+
+    def abort(self) -> None:
+        self.failed = True
+        self.close()
+
+    def close(self) -> None:
+        if self.closed:
+            return
+        super().close()
+        if self.failed:
+            os.remove(self.temp_path)
+        else:
+            os.replace(self.temp_path, self.path)
+
+
+def _open_sink(destination: str) -> Any:
+    if destination.startswith("s3://"):
+        bucket, _, key = destination[len("s3://") :].partition("/")
+        if not bucket or not key:
+            raise Exception(f"Invalid S3 destination: {destination}")
+        return _S3MultipartWriter(Config.get_aws_s3(), bucket, key)
+    return _FileWriter(destination)
+
+
+def _get_sources(
+    model: str,
+    platform: Optional[str] = None,
+    app_id: Optional[str] = None,
+    total_segments: int = 1,
+    page_size: int = EXPORT_PAGE_SIZE,
+    rate_limit: Optional[float] = None,
+) -> Tuple[Any, List[Callable[[], Iterator[Any]]]]:
+    """
+    Return the serializer for the model and one row generator per worker.
+    A tenant (platform and/or app_id) is read with a single partition query;
+    the whole table with a segmented scan, one segment per worker.
+    """
+    if model == "threads":
+        from ..models.thread import ThreadModel as model_class
+        from ..models.thread import thread_serializer as serializer
+
+        if app_id:
+            condition = model_class.platform == platform if platform else None
+            query = functools.partial(
+                model_class.app_id_created_at_index.query, app_id, filter_condition=condition
+            )
+        elif platform:
+            query = functools.partial(model_class.query, platform)
+        else:
+            query = None
+    elif model == "apps":
+        from ..models.app import AppModel as model_class
+        from ..models.app import app_serializer as serializer
+
+        if app_id:
+            condition = model_class.platform == platform if platform else None
+            query = functools.partial(model_class.query, app_id, filter_condition=condition)
+        elif platform:
+            query = functools.partial(model_class.platform_status_index.query, platform)
+        else:
+            query = None
+    else:
+        raise Exception(f"Unknown export model: {model}")
+
+    if query is not None:
+        return serializer, [
+            functools.partial(query, page_size=page_size, rate_limit=rate_limit)
+        ]
+
+    if total_segments <= 1:
+        return serializer, [
+            functools.partial(model_class.scan, page_size=page_size, rate_limit=rate_limit)
+        ]
+    return serializer, [
+        functools.partial(
+            model_class.scan,
+            segment=segment,
+            total_segments=total_segments,
+            page_size=page_size,
+            rate_limit=rate_limit,
+        )
+        for segment in range(total_segments)
+    ]
+
+
+def export_ndjson(
+    model: str,
+    destination: str,
+    platform: Optional[str] = None,
+    app_id: Optional[str] = None,
+    total_segments: int = 1,
+    page_size: int = EXPORT_PAGE_SIZE,
+    rate_limit: Optional[float] = None,
+    logger: Any = None,
+) -> Dict[str, Any]:
+    """
+    Stream every row of a model to gzip-compressed NDJSON.
+    Rows are read page by page, serialized by the worker that read them and
+    passed through a bounded queue to a single writer, so memory use does not
+    grow with the table size.
+    Args:
+        model (str): "apps" or "threads".
+        destination (str): A local path or s3://bucket/key.
+        platform (str): Export one platform's rows only.
+        app_id (str): Export one app's rows only.
+        total_segments (int): Parallel Scan segments (and worker threads) for a
+            whole-table export; ignored for platform/app_id exports.
+        page_size (int): Items per DynamoDB page.
+        rate_limit (float): Optional consumed read capacity per second.
+    Returns:
+        Dict with the row count, compressed bytes and elapsed seconds.
+    """
+    serializer, sources = _get_sources(
+        model,
+        platform=platform,
+        app_id=app_id,
+        total_segments=total_segments,
+        page_size=page_size,
+        rate_limit=rate_limit,
+    )
+    start = time.perf_counter()
+    rows = queue.Queue(maxsize=EXPORT_QUEUE_SIZE)
+    stop = threading.Event()
+    errors = []
+
+    def produce(source: Callable[[], Iterator[Any]]) -> None:
+        try:
+            for entity in source():
+                if stop.is_set():
+                    return
+                data = serializer.to_dict(entity)
+                # Only stored attributes, so the file can be fed back to import_data.
+                line = json.dumps(
+                    {name: data[name] for name in serializer.fields},
+                    separators=(",", ":"),
+                    default=_json_default,
+                )
+                rows.put(line.encode("utf-8") + b"\n")
+        except Exception as e:
+            errors.append(e)
+            stop.set()
+        finally:
+            rows.put(_DONE)
+
+    workers = [
+        threading.Thread(target=produce, args=(source,), daemon=True)
+        for source in sources
+    ]
+    # Open the destination first, so a bad path or bucket fails before any read.
+    sink = _open_sink(destination)
+    count, running = 0, 0
+    try:
+        for worker in workers:
+            worker.start()
+            running += 1
+        with gzip.GzipFile(fileobj=sink, mode="wb") as gzip_file:
+            while running:
+                line = rows.get()
+                if line is _DONE:
+                    running -= 1
+                    continue
+                gzip_file.write(line)
+                count += 1
+        if errors:
+            raise errors[0]
+    except BaseException:
+        stop.set()
+        # Drain so blocked workers can see the stop flag and exit.
+        while running:
+            if rows.get() is _DONE:
+                running -= 1
+        sink.abort()
+        raise
+    sink.close()
+
+    result = {
+        "model": model,
+        "destination": destination,
+        "rows": count,
+        "bytes": sink.bytes_written,
+        "segments": len(sources),
+        "seconds": round(time.perf_counter() - start, 3),
+    }
+    if logger is not None:
+        logger.info(f"Exported {count} {model} to {destination} in {result['seconds']}s.")
+    return result
@@ -0,0 +1,284 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function
+
+__author__ = "bibow"
+
+import bisect
+import contextvars
+import functools
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional
+
+WRITE_OPERATIONS = {
+    "BatchWriteItem",
+    "DeleteItem",
+    "PutItem",
+    "TransactWriteItems",
+    "UpdateItem",
+}
+
+# Upper bounds in milliseconds; the last bucket catches everything above.
+HISTOGRAM_BUCKETS = [1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000]
+
+_current_request = contextvars.ContextVar("app_core_engine_request", default=None)
+_current_spans = contextvars.ContextVar("app_core_engine_spans", default=())
+
+
+def _new_dynamodb_stats() -> Dict[str, Any]:
+    return {"calls": 0, "ms": 0.0, "rcu": 0.0, "wcu": 0.0, "scanned": 0, "returned": 0}
+
+
+def _capacity_units(consumed_capacity: Any) -> float:
+    if isinstance(consumed_capacity, list):
+        return sum(_capacity_units(capacity) for capacity in consumed_capacity)
+    if isinstance(consumed_capacity, dict):
+        return float(consumed_capacity.get("CapacityUnits", 0) or 0)
+    return 0.0
+
+
+class Histogram:
+    def __init__(self) -> None:
+        self.counts = [0] * (len(HISTOGRAM_BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(HISTOGRAM_BUCKETS, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def to_dict(self) -> Dict[str, Any]:
+        buckets, cumulative = {}, 0
+        for bound, count in zip(HISTOGRAM_BUCKETS + ["+Inf"], self.counts):
+            cumulative += count
+            buckets[str(bound)] = cumulative
+        return {"count": self.count, "sum_ms": round(self.sum, 3), "buckets": buckets}
+
+
+class RequestMetrics:
+    """
+    Metrics for one GraphQL request: wall time and DynamoDB cost per
+    instrumented resolver/helper, plus request totals.
+    """
+
+    def __init__(self, operation: Optional[str] = None) -> None:
+        self.operation = operation
+        self.start = time.perf_counter()
+        self.spans = {}
+        self.dynamodb = _new_dynamodb_stats()
+        self.operations = {}
+        self._lock = threading.Lock()
+
+    def _get_span(self, name: str) -> Dict[str, Any]:
+        span = self.spans.get(name)
+        if span is None:
+            span = self.spans[name] = {"calls": 0, "ms": 0.0, "dynamodb": _new_dynamodb_stats()}
+        return span
+
+    def record_span(self, name: str, ms: float) -> None:
+        with self._lock:
+            span = self._get_span(name)
+            span["calls"] += 1
+            span["ms"] += ms
+
+    def record_dynamodb(self, operation_name: str, data: Optional[Dict[str, Any]], ms: float) -> None:
+        data = data or {}
+        units = _capacity_units(data.get("ConsumedCapacity"))
+        write = operation_name in WRITE_OPERATIONS
+        scanned = data.get("ScannedCount", 0)
+        returned = data.get("Count", 1 if data.get("Item") else 0)
+        with self._lock:
+            self.operations[operation_name] = self.operations.get(operation_name, 0) + 1
+            # Every open span gets the call, so spans are inclusive of nested helpers.
+            targets = [self.dynamodb] + [self._get_span(name)["dynamodb"] for name in _current_spans.get()]
+            for stats in targets:
+                stats["calls"] += 1
+                stats["ms"] += ms
+                stats["wcu" if write else "rcu"] += units
+                stats["scanned"] += scanned
+                stats["returned"] += returned
+
+    def to_record(self) -> Dict[str, Any]:
+        def _round(stats: Dict[str, Any]) -> Dict[str, Any]:
+            return {k: round(v, 3) if isinstance(v, float) else v for k, v in stats.items()}
+
+        with self._lock:
+            return {
+                "operation": self.operation,
+                "ms": round((time.perf_counter() - self.start) * 1000, 3),
+                "dynamodb": dict(_round(self.dynamodb), operations=dict(self.operations)),
+                "resolvers": {
+                    name: dict(
+                        calls=span["calls"],
+                        ms=round(span["ms"], 3),
+                        dynamodb=_round(span["dynamodb"]),
+                    )
+                    for name, span in self.spans.items()
+                },
+            }
+
+
+class Instrumentation:
+    """
+    Pluggable per-request instrumentation.
+    When enabled, every request emits one compact record to each sink (the
+    logger by default) and feeds process-wide latency histograms that can be
+    scraped through get_histograms().
+    """
+
+    enabled = False
+    log_records = True
+    sinks = []
+    histograms = {}
+    _lock = threading.Lock()
+
+    @classmethod
+    def configure(cls, setting: Dict[str, Any]) -> None:
+        """
+        Apply instrumentation settings.
+        Args:
+            setting (Dict[str, Any]): Configuration dictionary.
+        """
+        cls.enabled = bool(setting.get("instrumentation_enabled", cls.enabled))
+        cls.log_records = bool(setting.get("instrumentation_log_records", cls.log_records))
+        if cls.enabled:
+            install_dynamodb_hook()
+
+    @classmethod
+    def add_sink(cls, sink: Callable[[Dict[str, Any]], None]) -> None:
+        cls.sinks.append(sink)
+
+    @classmethod
+    def start_request(cls, operation: Optional[str] = None) -> Optional[contextvars.Token]:
+        if not cls.enabled:
+            return None
+        return _current_request.set(RequestMetrics(operation))
+
+    @classmethod
+    def finish_request(
+        cls, token: Optional[contextvars.Token], logger: Optional[logging.Logger] = None
+    ) -> Optional[Dict[str, Any]]:
+        if token is None:
+            return None
+        metrics = _current_request.get()
+        _current_request.reset(token)
+        if metrics is None:
+            return None
+
+        record = metrics.to_record()
+        cls.observe("request", record["ms"])
+        for name, span in record["resolvers"].items():
+            cls.observe(name, span["ms"])
+
+        if cls.log_records and logger is not None:
+            logger.info(json.dumps(record, separators=(",", ":"), default=str))
+        for sink in cls.sinks:
+            try:
+                sink(record)
+            except Exception:
+                if logger is not None:
+                    logger.exception("Instrumentation sink failed.")
+        return record
+
+    @classmethod
+    def observe(cls, name: str, ms: float) -> None:
+        with cls._lock:
+            histogram = cls.histograms.get(name)
+            if histogram is None:
+                histogram = cls.histograms[name] = Histogram()
+            histogram.observe(ms)
+
+    @classmethod
+    def get_histograms(cls) -> Dict[str, Dict[str, Any]]:
+        with cls._lock:
+            return {name: histogram.to_dict() for name, histogram in cls.histograms.items()}
+
+    @classmethod
+    def reset_histograms(cls) -> None:
+        with cls._lock:
+            cls.histograms = {}
+
+
+def current_request() -> Optional[RequestMetrics]:
+    return _current_request.get()
+
+
+@contextmanager
+def _span(metrics: RequestMetrics, name: str) -> Iterator[None]:
+    token = _current_spans.set(_current_spans.get() + (name,))
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.record_span(name, (time.perf_counter() - start) * 1000)
+        _current_spans.reset(token)
+
+
+def instrument(funct: Callable[..., Any]) -> Callable[..., Any]:
+    """
+    Record wall time and the DynamoDB calls made inside funct against the
+    current request. A no-op outside an instrumented request.
+    """
+    name = funct.__name__
+
+    @functools.wraps(funct)
+    def wrapper(*args: Any, **kwargs: Any) -> Any:
+        metrics = _current_request.get()
+        if metrics is None:
+            return funct(*args, **kwargs)
+        with _span(metrics, name):
+            return funct(*args, **kwargs)
+
+    return wrapper
+
+
+class ResolverMiddleware:
+    """
+    graphene middleware that instruments the root Query/Mutation fields.
+    """
+
+    def resolve(self, next_: Callable[..., Any], root: Any, info: Any, **kwargs: Any) -> Any:
+        metrics = _current_request.get()
+        if root is not None or metrics is None:
+            return next_(root, info, **kwargs)
+        with _span(metrics, info.field_name):
+            return next_(root, info, **kwargs)
+
+
+_hook_lock = threading.Lock()
+
+
+def install_dynamodb_hook() -> None:
+    """
+    Wrap pynamodb's Connection.dispatch once so every DynamoDB call is
+    recorded against the current request. pynamodb already asks for
+    ReturnConsumedCapacity=TOTAL on data-plane calls.
+    """
+    from pynamodb.connection.base import Connection
+
+    with _hook_lock:
+        if getattr(Connection.dispatch, "_instrumented", False):
+            return
+        original = Connection.dispatch
+
+        @functools.wraps(original)
+        def dispatch(self: Any, operation_name: str, operation_kwargs: Dict[str, Any]) -> Any:
+            metrics = _current_request.get()
+            if metrics is None:
+                return original(self, operation_name, operation_kwargs)
+
+            data, start = None, time.perf_counter()
+            try:
+                data = original(self, operation_name, operation_kwargs)
+                return data
+            finally:
+                metrics.record_dynamodb(
+                    operation_name, data, (time.perf_counter() - start) * 1000
+                )
+
+        dispatch._instrumented = True
+        Connection.dispatch = dispatch
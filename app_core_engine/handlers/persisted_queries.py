@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function
+
+__author__ = "bibow"
+
+import contextvars
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from graphql import GraphQLError
+
+# The persisted query of the request being executed, set by start_request.
+_persisted_query = contextvars.ContextVar("persisted_query", default=None)
+
+
+def get_query_hash(query: str) -> str:
+    return hashlib.sha256(query.encode("utf-8")).hexdigest()
+
+
+class PersistedQueries:
+    """
+    Automatic persisted queries, following the Apollo protocol: the client
+    sends extensions.persistedQuery.sha256Hash instead of the document text
+    and only sends the text again when the server answers
+    PersistedQueryNotFound. Hashes registered that way live in a bounded LRU;
+    queries from the allow-list are always known, are parsed and validated
+    when the schema is built, and with persisted_queries_only set are the
+    only documents accepted.
+    """
+
+    enabled = False
+    only = False
+    cache_size = 1000
+    allow_list_path = None
+    # sha256 -> query text.
+    allow_list = {}
+    queries = OrderedDict()
+    _allowed_queries = frozenset()
+    _lock = threading.Lock()
+
+    @classmethod
+    def configure(cls, setting: Dict[str, Any]) -> None:
+        """
+        Apply persisted query settings.
+        Args:
+            setting (Dict[str, Any]): Configuration dictionary.
+        """
+        cls.enabled = bool(setting.get("persisted_queries_enabled", cls.enabled))
+        cls.only = bool(setting.get("persisted_queries_only", cls.only))
+        cls.cache_size = int(setting.get("persisted_query_cache_size", cls.cache_size))
+        cls.allow_list_path = setting.get(
+            "persisted_query_allow_list_path", cls.allow_list_path
+        )
+
+    @classmethod
+    def load_allow_list(cls, path: str) -> int:
+        """
+        Load pre-registered queries from a local path or s3://bucket/key.
+        The file is either a JSON object of sha256 hash to query, or an Apollo
+        persisted query manifest ({"operations": [{"id": ..., "body": ...}]}).
+        Returns:
+            The number of queries loaded.
+        """
+        if path.startswith("s3://"):
+            from .config import Config
+
+            bucket, _, key = path[len("s3://") :].partition("/")
+            body = Config.get_aws_s3().get_object(Bucket=bucket, Key=key)["Body"].read()
+            manifest = json.loads(body)
+        else:
+            with open(path) as allow_list:
+                manifest = json.load(allow_list)
+
+        if isinstance(manifest, dict) and "operations" in manifest:
+            entries = [
+                (operation["id"], operation["body"]) for operation in manifest["operations"]
+            ]
+        else:
+            entries = list(manifest.items())
+
+        allow_list = {}
+        for query_hash, query in entries:
+            if get_query_hash(query) != query_hash:
+                raise Exception(f"Persisted query {query_hash} does not match its hash.")
+            allow_list[query_hash] = query
+
+        with cls._lock:
+            cls.allow_list = allow_list
+            cls._allowed_queries = frozenset(allow_list.values())
+        return len(allow_list)
+
+    @classmethod
+    def get_query(cls, query_hash: str) -> Optional[str]:
+        query = cls.allow_list.get(query_hash)
+        if query is not None:
+            return query
+        with cls._lock:
+            query = cls.queries.get(query_hash)
+            if query is not None:
+                cls.queries.move_to_end(query_hash)
+            return query
+
+    @classmethod
+    def register(cls, query_hash: str, query: str) -> None:
+        if query_hash in cls.allow_list or cls.cache_size <= 0:
+            return
+        with cls._lock:
+            cls.queries[query_hash] = query
+            cls.queries.move_to_end(query_hash)
+            while len(cls.queries) > cls.cache_size:
+                cls.queries.popitem(last=False)
+
+    @classmethod
+    def start_request(cls, params: Dict[str, Any]) -> Optional[contextvars.Token]:
+        """
+        Record the persisted query hash of a request, if any, and fill in
+        params["query"] when the hash is already known.
+        Returns:
+            A token for finish_request.
+        """
+        if not cls.enabled:
+            return None
+
+        extensions = params.get("extensions") or {}
+        if isinstance(extensions, str):
+            extensions = json.loads(extensions)
+        persisted_query = extensions.get("persistedQuery")
+        if not persisted_query or not persisted_query.get("sha256Hash"):
+            return _persisted_query.set(None)
+
+        query_hash = persisted_query["sha256Hash"]
+        query = params.get("query")
+        if not query:
+            params["query"] = cls.get_query(query_hash)
+        return _persisted_query.set({"hash": query_hash, "query": query})
+
+    @staticmethod
+    def finish_request(token: Optional[contextvars.Token]) -> None:
+        if token is not None:
+            _persisted_query.reset(token)
+
+    @classmethod
+    def resolve(cls, request_string: Optional[str]) -> Tuple[Optional[str], List[GraphQLError]]:
+        """
+        Return the document text to execute for the current request, or the
+        errors the client must see (PersistedQueryNotFound makes Apollo
+        clients retry with the text).
+        """
+        request = _persisted_query.get()
+        if request is None:
+            if cls.only and request_string not in cls._allowed_queries:
+                return None, [
+                    GraphQLError(
+                        "Only persisted queries are accepted.",
+                        extensions={"code": "PERSISTED_QUERY_NOT_ALLOWED"},
+                    )
+                ]
+            return request_string, []
+
+        query_hash = request["hash"]
+        if request["query"] is None:
+            query = request_string or cls.get_query(query_hash)
+            if query is None:
+                return None, [
+                    GraphQLError(
+                        "PersistedQueryNotFound",
+                        extensions={"code": "PERSISTED_QUERY_NOT_FOUND"},
+                    )
+                ]
+            return query, []
+
+        query = request["query"]
+        if get_query_hash(query) != query_hash:
+            return None, [
+                GraphQLError(
+                    "provided sha does not match query",
+                    extensions={"code": "PERSISTED_QUERY_HASH_MISMATCH"},
+                )
+            ]
+        if cls.only and query_hash not in cls.allow_list:
+            return None, [
+                GraphQLError(
+                    "Only persisted queries are accepted.",
+                    extensions={"code": "PERSISTED_QUERY_NOT_ALLOWED"},
+                )
+            ]
+        return query, []
+
+    @classmethod
+    def register_current(cls) -> None:
+        """
+        Remember the hash and text sent by the current request once its
+        document is known to be valid.
+        """
+        request = _persisted_query.get()
+        if request is not None and request["query"] is not None:
+            cls.register(request["hash"], request["query"])
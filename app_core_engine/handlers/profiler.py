@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function
+
+__author__ = "bibow"
+
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from importlib.abc import MetaPathFinder
+from typing import Any, Dict, Iterator, List, Optional
+
+# Set to "1" to record a per-module import-time breakdown from the moment
+# app_core_engine is imported.
+PROFILE_ENV_VAR = "APP_CORE_ENGINE_PROFILE_COLD_START"
+
+
+class _TimingLoader:
+    """
+    Wraps a module loader to time exec_module; nested imports are tracked on a
+    stack so each module gets both its cumulative and its self time.
+    """
+
+    def __init__(self, loader: Any, profiler: "ColdStartProfiler") -> None:
+        self.loader = loader
+        self.profiler = profiler
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.loader, name)
+
+    def create_module(self, spec: Any) -> Any:
+        return self.loader.create_module(spec)
+
+    def exec_module(self, module: Any) -> None:
+        stack = self.profiler._stack()
+        stack.append(0.0)
+        start = time.perf_counter()
+        try:
+            self.loader.exec_module(module)
+        finally:
+            cumulative = time.perf_counter() - start
+            children = stack.pop()
+            if stack:
+                stack[-1] += cumulative
+            self.profiler.record_import(module.__name__, cumulative, cumulative - children)
+
+
+class _TimingFinder(MetaPathFinder):
+    def __init__(self, profiler: "ColdStartProfiler") -> None:
+        self.profiler = profiler
+
+    def find_spec(self, fullname: str, path: Any, target: Any = None) -> Any:
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, "find_spec"):
+                continue
+            spec = finder.find_spec(fullname, path, target)
+            if spec is not None:
+                if spec.loader is not None and hasattr(spec.loader, "exec_module"):
+                    spec.loader = _TimingLoader(spec.loader, self.profiler)
+                return spec
+        return None
+
+
+class ColdStartProfiler:
+    """
+    Records import times and named cold-start phases (such as Config.initialize).
+    Phases are always recorded; import timing only while started.
+    """
+
+    def __init__(self) -> None:
+        self.imports = {}
+        self.phases = {}
+        self._finder = None
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def _stack(self) -> List[float]:
+        if not hasattr(self._local, "stack"):
+            self._local.stack = []
+        return self._local.stack
+
+    @property
+    def enabled(self) -> bool:
+        return self._finder is not None
+
+    def start(self) -> None:
+        if self._finder is None:
+            self._finder = _TimingFinder(self)
+            sys.meta_path.insert(0, self._finder)
+
+    def stop(self) -> None:
+        if self._finder is not None:
+            sys.meta_path.remove(self._finder)
+            self._finder = None
+
+    def record_import(self, name: str, cumulative: float, self_time: float) -> None:
+        with self._lock:
+            self.imports[name] = (cumulative, self_time)
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.phases[name] = time.perf_counter() - start
+
+    def report(self, top: Optional[int] = 30) -> Dict[str, Any]:
+        """
+        Return the slowest imports by self time and the recorded phases, in ms.
+        """
+        with self._lock:
+            imports = sorted(self.imports.items(), key=lambda item: -item[1][1])
+            phases = dict(self.phases)
+        return {
+            "imports": [
+                {
+                    "module": name,
+                    "self_ms": round(self_time * 1000, 3),
+                    "cumulative_ms": round(cumulative * 1000, 3),
+                }
+                for name, (cumulative, self_time) in imports[:top]
+            ],
+            "total_import_ms": round(sum(item[1][1] for item in imports) * 1000, 3),
+            "phases_ms": {name: round(value * 1000, 3) for name, value in phases.items()},
+        }
+
+
+profiler = ColdStartProfiler()
+
+if os.environ.get(PROFILE_ENV_VAR) == "1":
+    profiler.start()
@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function
+
+__author__ = "bibow"
+
+import random
+import threading
+from typing import Any, Callable, Dict
+
+from botocore.exceptions import (
+    ClientError,
+    ConnectionClosedError,
+    ConnectTimeoutError,
+    EndpointConnectionError,
+    ReadTimeoutError,
+)
+from pynamodb.exceptions import DoesNotExist, PynamoDBException
+from tenacity import RetryCallState, retry, retry_if_exception
+
+# DynamoDB error codes worth retrying; anything else (validation, conditional
+# check, missing item, ...) is raised to the caller right away.
+TRANSIENT_ERROR_CODES = {
+    "InternalServerError",
+    "ProvisionedThroughputExceededException",
+    "RequestLimitExceeded",
+    "ServiceUnavailable",
+    "ThrottlingException",
+    "TransactionInProgressException",
+}
+
+TRANSIENT_NETWORK_ERRORS = (
+    ConnectionClosedError,
+    ConnectTimeoutError,
+    EndpointConnectionError,
+    ReadTimeoutError,
+)
+
+
+def is_transient_error(exception: BaseException) -> bool:
+    """
+    Return True for throttling and transient network errors, walking the
+    pynamodb `cause` / `__cause__` chain.
+    """
+    seen = set()
+    while exception is not None and id(exception) not in seen:
+        seen.add(id(exception))
+        if isinstance(exception, DoesNotExist):
+            return False
+        if isinstance(exception, TRANSIENT_NETWORK_ERRORS):
+            return True
+        if isinstance(exception, PynamoDBException):
+            # Not cause_response_code: it fails when the cause is a network
+            # error, whose response is None.
+            response = getattr(exception.cause, "response", None) or {}
+            if response.get("Error", {}).get("Code") in TRANSIENT_ERROR_CODES:
+                return True
+        elif isinstance(exception, ClientError):
+            code = exception.response.get("Error", {}).get("Code")
+            return code in TRANSIENT_ERROR_CODES
+        exception = getattr(exception, "cause", None) or exception.__cause__
+    return False
+
+
+class RetryPolicy:
+    """
+    Shared retry policy for DynamoDB helpers.
+    Retries only transient errors with full-jitter exponential backoff,
+    bounded by both an attempt count and a total time budget.
+    """
+
+    max_attempts = 5
+    base_delay = 0.1
+    max_delay = 2.0
+    # Seconds; keep well below the Lambda timeout.
+    time_budget = 10.0
+    stats = {}
+    _lock = threading.Lock()
+
+    @classmethod
+    def configure(cls, setting: Dict[str, Any]) -> None:
+        """
+        Apply retry settings.
+        Args:
+            setting (Dict[str, Any]): Configuration dictionary.
+        """
+        cls.max_attempts = int(setting.get("retry_max_attempts", cls.max_attempts))
+        cls.base_delay = float(setting.get("retry_base_delay", cls.base_delay))
+        cls.max_delay = float(setting.get("retry_max_delay", cls.max_delay))
+        cls.time_budget = float(setting.get("retry_time_budget", cls.time_budget))
+
+    @classmethod
+    def _count(cls, name: str, counter: str) -> None:
+        with cls._lock:
+            stats = cls.stats.setdefault(
+                name, {"calls": 0, "retries": 0, "exhausted": 0}
+            )
+            stats[counter] += 1
+
+    @classmethod
+    def get_stats(cls) -> Dict[str, Dict[str, int]]:
+        with cls._lock:
+            return {name: dict(stats) for name, stats in cls.stats.items()}
+
+    @classmethod
+    def reset_stats(cls) -> None:
+        with cls._lock:
+            cls.stats = {}
+
+    @classmethod
+    def delay(cls, attempt_number: int) -> float:
+        """Full-jitter exponential backoff for the given (1-based) attempt."""
+        return random.uniform(
+            0, min(cls.max_delay, cls.base_delay * 2 ** (attempt_number - 1))
+        )
+
+    @classmethod
+    def wait(cls, retry_state: RetryCallState) -> float:
+        remaining = cls.time_budget - retry_state.seconds_since_start
+        return max(0.0, min(cls.delay(retry_state.attempt_number), remaining))
+
+    @classmethod
+    def stop(cls, retry_state: RetryCallState) -> bool:
+        if (
+            retry_state.attempt_number >= cls.max_attempts
+            or retry_state.seconds_since_start >= cls.time_budget
+        ):
+            cls._count(_funct_name(retry_state), "exhausted")
+            return True
+        return False
+
+    @classmethod
+    def before(cls, retry_state: RetryCallState) -> None:
+        if retry_state.attempt_number == 1:
+            cls._count(_funct_name(retry_state), "calls")
+
+    @classmethod
+    def before_sleep(cls, retry_state: RetryCallState) -> None:
+        cls._count(_funct_name(retry_state), "retries")
+
+
+def _funct_name(retry_state: RetryCallState) -> str:
+    return getattr(retry_state.fn, "__name__", "unknown")
+
+
+def dynamodb_retry(funct: Callable[..., Any]) -> Callable[..., Any]:
+    """
+    Decorate a DynamoDB helper with the shared RetryPolicy.
+    """
+    return retry(
+        reraise=True,
+        retry=retry_if_exception(is_transient_error),
+        wait=RetryPolicy.wait,
+        stop=RetryPolicy.stop,
+        before=RetryPolicy.before,
+        before_sleep=RetryPolicy.before_sleep,
+    )(funct)
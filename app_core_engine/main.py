@@ -4,16 +4,19 @@ from __future__ import print_function
 
 __author__ = "bibow"
 
+import json
 import logging
 from typing import Any, Dict, List
 
 from graphene import Schema
 
 from silvaengine_utility import Graphql
-from silvaengine_dynamodb_base import BaseModel
 
 from .handlers.config import Config
-from .schema import Mutations, Query, type_class
+from .handlers.executor import get_cached_schema
+from .handlers.instrumentation import Instrumentation
+from .handlers.persisted_queries import PersistedQueries
+from .handlers.profiler import profiler
 
 
 # Hook function applied to deployment
@@ -36,6 +39,10 @@ def deploy() -> List:
                             "action": "appList",
                             "label": "View App List",
                         },
+                        {
+                            "action": "installedAppToken",
+                            "label": "View Installed App Token",
+                        },
                         {
                             "action": "appConfig",
                             "label": "View App Config",
@@ -74,6 +81,10 @@ def deploy() -> List:
                             "action": "insertThread",
                             "label": "Create Update Thread",
                         },
+                        {
+                            "action": "insertThreads",
+                            "label": "Create Threads",
+                        },
                         {
                             "action": "deleteThread",
                             "label": "Delete Thread",
@@ -85,7 +96,37 @@ def deploy() -> List:
                     "is_graphql": True,
                     "settings": "app_core_engine",
                     "disabled_in_resources": True,  # Ignore adding to resource list.
-                }
+                },
+                "import_data": {
+                    "is_static": False,
+                    "label": "App Core Engine Import Data",
+                    "type": "Event",
+                    "support_methods": ["POST"],
+                    "is_auth_required": False,
+                    "is_graphql": False,
+                    "settings": "app_core_engine",
+                    "disabled_in_resources": True,  # Ignore adding to resource list.
+                },
+                "export_data": {
+                    "is_static": False,
+                    "label": "App Core Engine Export Data",
+                    "type": "Event",
+                    "support_methods": ["POST"],
+                    "is_auth_required": False,
+                    "is_graphql": False,
+                    "settings": "app_core_engine",
+                    "disabled_in_resources": True,  # Ignore adding to resource list.
+                },
+                "reconcile_counters": {
+                    "is_static": False,
+                    "label": "App Core Engine Reconcile Counters",
+                    "type": "Event",
+                    "support_methods": ["POST"],
+                    "is_auth_required": False,
+                    "is_graphql": False,
+                    "settings": "app_core_engine",
+                    "disabled_in_resources": True,  # Ignore adding to resource list.
+                },
             },
         }
     ]
@@ -95,6 +136,10 @@ class AppCoreEngine(Graphql):
     def __init__(self, logger: logging.Logger, **setting: Dict[str, Any]) -> None:
         Graphql.__init__(self, logger, **setting)
 
+        # Loaded here rather than at import time, which keeps pynamodb off the
+        # import path of deploy().
+        from silvaengine_dynamodb_base import BaseModel
+
         if (
             setting.get("region_name")
             and setting.get("aws_access_key_id")
@@ -111,12 +156,96 @@ class AppCoreEngine(Graphql):
         self.setting = setting
 
     def app_core_engine_graphql(self, **params: Dict[str, Any]) -> Any:
-        return self.execute(self.__class__.build_graphql_schema(), **params)
+        schema = get_cached_schema(
+            self.__class__.build_graphql_schema,
+            document_cache_size=Config.graphql_document_cache_size,
+        )
+        if profiler.enabled:
+            # The first request completes the cold start; report and stop timing imports.
+            profiler.stop()
+            self.logger.info(f"Cold start profile: {json.dumps(profiler.report())}")
+        token = Instrumentation.start_request(params.get("operation_name"))
+        # Clients may send extensions.persistedQuery.sha256Hash instead of the query.
+        persisted_query_token = PersistedQueries.start_request(params)
+        try:
+            return self.execute(schema, **params)
+        finally:
+            PersistedQueries.finish_request(persisted_query_token)
+            Instrumentation.finish_request(token, self.logger)
+
+    def export_data(self, **params: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Stream apps or threads to gzip NDJSON in a local file or on S3.
+        Args:
+            model (str): "apps" or "threads".
+            destination (str): A local path or s3://bucket/key.
+            platform (str): Optional; export one platform's rows.
+            app_id (str): Optional; export one app's rows.
+            total_segments (int): Parallel Scan segments for whole-table exports.
+            page_size (int): Optional DynamoDB page size.
+            rate_limit (float): Optional read capacity units per second.
+        """
+        from .handlers.export import EXPORT_PAGE_SIZE, export_ndjson
+
+        return export_ndjson(
+            params["model"],
+            params["destination"],
+            platform=params.get("platform"),
+            app_id=params.get("app_id"),
+            total_segments=int(params.get("total_segments", 1)),
+            page_size=int(params.get("page_size", EXPORT_PAGE_SIZE)),
+            rate_limit=params.get("rate_limit"),
+            logger=self.logger,
+        )
+
+    def import_data(self, **params: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Bulk load apps, app configs or threads from NDJSON or CSV.
+        Args:
+            model (str): "apps", "app_configs" or "threads".
+            source (str): A local path or s3://bucket/key, optionally gzipped.
+            format (str): Optional "ndjson" or "csv"; guessed from the extension.
+            checkpoint_path (str): Optional resume file.
+            error_path (str): Optional NDJSON file for rejected rows.
+            chunk_size (int): Optional rows per worker task.
+            workers (int): Optional number of concurrent writers.
+        """
+        from .handlers.bulk_import import IMPORT_CHUNK_SIZE, IMPORT_WORKERS, import_rows
+
+        return import_rows(
+            params["model"],
+            params["source"],
+            file_format=params.get("format"),
+            checkpoint_path=params.get("checkpoint_path"),
+            error_path=params.get("error_path"),
+            chunk_size=int(params.get("chunk_size", IMPORT_CHUNK_SIZE)),
+            workers=int(params.get("workers", IMPORT_WORKERS)),
+            logger=self.logger,
+        )
+
+    def reconcile_counters(self, **params: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Recount the materialized list totals and repair the ones that drifted.
+        Args:
+            kinds (List[str]): Optional counter kinds; all by default.
+            total_segments (int): Optional parallel Scan segments per table.
+        """
+        from .models.counter import reconcile_counters
+
+        return reconcile_counters(
+            kinds=params.get("kinds"),
+            total_segments=int(params.get("total_segments", 1)),
+            logger=self.logger,
+        )
 
     @staticmethod
     def build_graphql_schema() -> Schema:
-        return Schema(
-            query=Query,
-            mutation=Mutations,
-            types=type_class()
-        )
+        with profiler.phase("build_graphql_schema"):
+            # Models, types and mutations are imported on the first schema build.
+            from .schema import Mutations, Query, type_class
+
+            return Schema(
+                query=Query,
+                mutation=Mutations,
+                types=type_class()
+            )
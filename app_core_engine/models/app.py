@@ -7,7 +7,7 @@ __author__ = "bibow"
 import logging
 import traceback
 import uuid
-from typing import Any, Dict
+from typing import Any, Dict, List, Optional
 
 import pendulum
 from graphene import ResolveInfo
@@ -17,21 +17,42 @@ from pynamodb.attributes import (
     UnicodeAttribute,
     UTCDateTimeAttribute,
 )
-from pynamodb.indexes import AllProjection, LocalSecondaryIndex
-from tenacity import retry, stop_after_attempt, wait_exponential
+from pynamodb.indexes import AllProjection, GlobalSecondaryIndex, LocalSecondaryIndex
+from pynamodb.exceptions import DoesNotExist, UpdateError
 
 from silvaengine_dynamodb_base import (
     BaseModel,
     delete_decorator,
-    insert_update_decorator,
     monitor_decorator,
-    resolve_list_decorator,
 )
-from silvaengine_utility import Serializer
 
-from ..types.app import AppListType, AppType
-from .thread import resolve_thread_list
-from .utils import _get_app_config
+from ..handlers.instrumentation import instrument
+from ..handlers.retry_policy import dynamodb_retry
+from ..types.app import AppListType, AppType, InstalledAppTokenType
+from .counter import (
+    _is_conditional_check_failed,
+    counted,
+    counter_key,
+    counter_keys,
+    update_counters,
+)
+from .thread import ThreadModel
+from .pagination import resolve_cursor_list_decorator
+from .utils import (
+    ModelSerializer,
+    _exists_any,
+    _get_app_config_loader,
+    _get_attributes_to_get,
+    _is_selected,
+    insert_update_decorator,
+    installed_app_cache,
+)
+
+# AppType.app_config is looked up by the app's platform and app_id.
+APP_TYPE_REQUIRES = {"app_config": ["platform", "app_id"]}
+# Attributes kept in installed_app_cache; enough to call the target's API.
+INSTALLED_APP_ATTRIBUTES = ["app_id", "target_id", "platform", "access_token", "scope"]
+
 
 class TargetIdIndex(LocalSecondaryIndex):
     """
@@ -48,6 +69,36 @@ class TargetIdIndex(LocalSecondaryIndex):
     target_id = UnicodeAttribute(range_key=True)
 
 
+class TargetIdStatusIndex(GlobalSecondaryIndex):
+    """
+    This class represents a global secondary index
+    """
+
+    class Meta:
+        billing_mode = "PAY_PER_REQUEST"
+        # All attributes are projected
+        projection = AllProjection()
+        index_name = "target_id-status-index"
+
+    target_id = UnicodeAttribute(hash_key=True)
+    status = UnicodeAttribute(range_key=True)
+
+
+class PlatformStatusIndex(GlobalSecondaryIndex):
+    """
+    This class represents a global secondary index
+    """
+
+    class Meta:
+        billing_mode = "PAY_PER_REQUEST"
+        # All attributes are projected
+        projection = AllProjection()
+        index_name = "platform-status-index"
+
+    platform = UnicodeAttribute(hash_key=True)
+    status = UnicodeAttribute(range_key=True)
+
+
 class AppModel(BaseModel):
     class Meta(BaseModel.Meta):
         table_name = "ace-apps"
@@ -63,6 +114,8 @@ class AppModel(BaseModel):
     created_at = UTCDateTimeAttribute()
     updated_at = UTCDateTimeAttribute()
     target_id_index = TargetIdIndex()
+    target_id_status_index = TargetIdStatusIndex()
+    platform_status_index = PlatformStatusIndex()
 
 
 def create_app_table(logger: logging.Logger) -> bool:
@@ -74,21 +127,32 @@ def create_app_table(logger: logging.Logger) -> bool:
     return True
 
 
-@retry(
-    reraise=True,
-    wait=wait_exponential(multiplier=1, max=60),
-    stop=stop_after_attempt(5),
-)
-def get_app(app_id: str, target_id: str) -> AppModel:
-    return AppModel.get(app_id, target_id)
+app_serializer = ModelSerializer(AppModel, AppType)
 
 
-@retry(
-    reraise=True,
-    wait=wait_exponential(multiplier=1, max=60),
-    stop=stop_after_attempt(5),
-)
-def _get_installed_app(app_id: str, target_id: str) -> AppModel:
+@instrument
+@dynamodb_retry
+def get_app(
+    app_id: str, target_id: str, attributes_to_get: Optional[List[str]] = None
+) -> AppModel:
+    return AppModel.get(app_id, target_id, attributes_to_get=attributes_to_get)
+
+
+@instrument
+def _find_app(
+    app_id: str, target_id: str, attributes_to_get: Optional[List[str]] = None
+) -> Optional[AppModel]:
+    try:
+        return get_app(app_id, target_id, attributes_to_get=attributes_to_get)
+    except DoesNotExist:
+        return None
+
+
+@instrument
+@dynamodb_retry
+def _get_installed_app(
+    app_id: str, target_id: str, attributes_to_get: Optional[List[str]] = None
+) -> AppModel:
     try:
         results = AppModel.target_id_index.query(
             app_id,
@@ -96,6 +160,7 @@ def _get_installed_app(app_id: str, target_id: str) -> AppModel:
             filter_condition=(AppModel.status == "installed"),
             scan_index_forward=False,
             limit=1,
+            attributes_to_get=attributes_to_get,
         )
         app = results.next()
 
@@ -104,6 +169,27 @@ def _get_installed_app(app_id: str, target_id: str) -> AppModel:
         return None
 
 
+@instrument
+def get_installed_app(app_id: str, target_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Return the token record of an installed app, or None if it is not
+    installed, through installed_app_cache. Concurrent misses for the same
+    app share one query. Writes in this process invalidate the entry; other
+    processes see them once it expires.
+    """
+
+    def load() -> Optional[Dict[str, Any]]:
+        app = _get_installed_app(
+            app_id, target_id, attributes_to_get=INSTALLED_APP_ATTRIBUTES
+        )
+        if app is None:
+            return None
+        return {name: getattr(app, name) for name in INSTALLED_APP_ATTRIBUTES}
+
+    return installed_app_cache.get_or_load((app_id, target_id), load)
+
+
+@instrument
 def get_app_count(app_id: str, target_id: str) -> int:
     return AppModel.count(
         app_id, AppModel.target_id == target_id
@@ -111,34 +197,46 @@ def get_app_count(app_id: str, target_id: str) -> int:
 
 
 def get_app_type(info: ResolveInfo, app: AppModel) -> AppType:
-    try:
-        app_config = _get_app_config(app.platform, app.app_id)
-    except Exception as e:
-        log = traceback.format_exc()
-        info.context.get("logger").exception(log)
-        raise e
-    app = app.__dict__["attribute_values"]
-    app["app_config"] = app_config
-    return AppType(**Serializer.json_normalize(app))
+    # The config is fetched in one batch when AppType.app_config is resolved.
+    if _is_selected(info, "app_config"):
+        _get_app_config_loader(info).prime(app.platform, app.app_id)
+    return app_serializer.to_type(app)
 
 
+@instrument
 def resolve_app(info: ResolveInfo, **kwargs: Dict[str, Any]) -> AppType:
+    app = _find_app(
+        kwargs["app_id"],
+        kwargs["target_id"],
+        attributes_to_get=_get_attributes_to_get(
+            info, AppModel, requires=APP_TYPE_REQUIRES
+        ),
+    )
+    if app is None:
+        return None
 
-    count = get_app_count(kwargs["app_id"], kwargs["target_id"])
-    if count == 0:
+    return get_app_type(info, app)
+
+
+@instrument
+def resolve_installed_app_token(
+    info: ResolveInfo, **kwargs: Dict[str, Any]
+) -> InstalledAppTokenType:
+    installed_app = get_installed_app(kwargs["app_id"], kwargs["target_id"])
+    if installed_app is None:
         return None
 
-    return get_app_type(
-        info,
-        get_app(kwargs["app_id"], kwargs["target_id"]),
-    )
+    return InstalledAppTokenType(**installed_app)
 
 
+@instrument
 @monitor_decorator
-@resolve_list_decorator(
+@resolve_cursor_list_decorator(
     attributes_to_get=["app_id", "target_id"],
     list_type_class=AppListType,
     type_funct=get_app_type,
+    model_class=AppModel,
+    requires=APP_TYPE_REQUIRES,
 )
 def resolve_app_list(info: ResolveInfo, **kwargs: Dict[str, Any]) -> Any:
     platform = kwargs.get("platform")
@@ -159,46 +257,80 @@ def resolve_app_list(info: ResolveInfo, **kwargs: Dict[str, Any]) -> Any:
             args[1] = AppModel.target_id == target_id
             count_funct = AppModel.target_id_index.count
 
+    elif (target_id or platform) and len(statuses or []) <= 1:
+        # Single-partition query on a GSI instead of a table scan. status is
+        # the GSIs' range key and can't be filtered on, so several statuses
+        # fall back to the scan below.
+        if target_id:
+            index = AppModel.target_id_status_index
+            args = [target_id, None]
+        else:
+            index = AppModel.platform_status_index
+            args = [platform, None]
+            platform = None
+        inquiry_funct = index.query
+        count_funct = index.count
+        if statuses and len(statuses) == 1:
+            args[1] = AppModel.status == statuses[0]
+            statuses = None
+
     elif target_id:
         the_filters &= AppModel.target_id == target_id
 
     if platform:
         the_filters &= AppModel.platform == platform
-    
+
     if statuses:
         the_filters &= AppModel.status.is_in(*statuses)
 
     if the_filters is not None:
         args.append(the_filters)
 
+    # Totals of whole app / target-status partitions come from materialized counters.
+    if app_id and not target_id and not kwargs.get("platform") and not kwargs.get("statuses"):
+        count_funct = counted("apps:app_id", (app_id,), count_funct)
+    elif (
+        target_id
+        and not app_id
+        and not kwargs.get("platform")
+        and len(kwargs.get("statuses") or []) == 1
+    ):
+        count_funct = counted(
+            "apps:target_id,status", (target_id, kwargs["statuses"][0]), count_funct
+        )
+
     return inquiry_funct, count_funct, args
 
 
+@instrument
 def _uninstall_app(info: ResolveInfo, app_id: str, target_id: str) -> None:
+    # (app_id, target_id) is the table key, so at most one app can match.
     try:
-        # Query for installed apps
-        apps = AppModel.target_id_index.query(
-            app_id,
-            AppModel.target_id == target_id,
-            filter_condition=AppModel.status == "installed",
+        AppModel(app_id, target_id).update(
+            actions=[
+                AppModel.status.set("uninstalled"),
+                AppModel.updated_at.set(pendulum.now("UTC")),
+            ],
+            condition=AppModel.status == "installed",
         )
-        # Update status to uninstalled
-        for app in apps:
-            app.status = "uninstalled"
-            app.save()
-        return
-    except Exception as e:
-        log = traceback.format_exc()
-        info.context.get("logger").error(log)
-        raise e
-    
+    except UpdateError as e:
+        # Missing or no longer installed: nothing to uninstall.
+        if not _is_conditional_check_failed(e):
+            log = traceback.format_exc()
+            info.context.get("logger").error(log)
+            raise e
+    finally:
+        installed_app_cache.invalidate((app_id, target_id))
+
+
+@instrument
 @insert_update_decorator(
     keys={
         "hash_key": "app_id",
         "range_key": "target_id",
     },
+    get_funct=_find_app,
     model_funct=get_app,
-    count_funct=get_app_count,
     type_funct=get_app_type,
     range_key_required=True,
     # data_attributes_except_for_data_diff=["created_at", "updated_at"],
@@ -218,11 +350,17 @@ def insert_update_app(info: ResolveInfo, **kwargs: Dict[str, Any]) -> None:
             "updated_at": pendulum.now("UTC"),
         }
 
-        AppModel(
+        app = AppModel(
             app_id,
             target_id,
             **cols,
-        ).save()
+        )
+        app.save()
+        installed_app_cache.invalidate((app_id, target_id))
+        update_counters(
+            {key: 1 for key in counter_keys("apps", app)},
+            logger=info.context.get("logger"),
+        )
         return
 
     app = kwargs.get("entity")
@@ -250,10 +388,21 @@ def insert_update_app(info: ResolveInfo, **kwargs: Dict[str, Any]) -> None:
             actions.append(field.set(None if kwargs[key] == "null" else kwargs[key]))
 
     # Update the agent
+    status = app.status
     app.update(actions=actions)
+    installed_app_cache.invalidate((app_id, app.target_id))
+    if "status" in kwargs and app.status != status:
+        update_counters(
+            {
+                counter_key("apps:target_id,status", app.target_id, status): -1,
+                counter_key("apps:target_id,status", app.target_id, app.status): 1,
+            },
+            logger=info.context.get("logger"),
+        )
     return
 
 
+@instrument
 @delete_decorator(
     keys={
         "hash_key": "app_id",
@@ -262,16 +411,18 @@ def insert_update_app(info: ResolveInfo, **kwargs: Dict[str, Any]) -> None:
     model_funct=get_app,
 )
 def delete_app(info: ResolveInfo, **kwargs: Dict[str, Any]) -> bool:
-    thread_list = resolve_thread_list(
-        info,
-        **{
-            "app_id": kwargs["entity"].app_id,
-            "target_id": kwargs["entity"].target_id,
-        },
-    )
-    if thread_list.total > 0:
+    if _exists_any(
+        ThreadModel.app_id_created_at_index.query,
+        kwargs["entity"].app_id,
+        attributes_to_get=["platform", "thread_uuid"],
+    ):
         return False
 
     kwargs["entity"].delete()
+    installed_app_cache.invalidate((kwargs["entity"].app_id, kwargs["entity"].target_id))
+    update_counters(
+        {key: -1 for key in counter_keys("apps", kwargs["entity"])},
+        logger=info.context.get("logger"),
+    )
 
     return True
@@ -7,7 +7,7 @@ __author__ = "bibow"
 import logging
 import traceback
 import uuid
-from typing import Any, Dict
+from typing import Any, Dict, List, Optional
 
 import pendulum
 from graphene import ResolveInfo
@@ -18,19 +18,26 @@ from pynamodb.attributes import (
     UTCDateTimeAttribute,
 )
 from pynamodb.indexes import AllProjection, LocalSecondaryIndex
-from tenacity import retry, stop_after_attempt, wait_exponential
+from pynamodb.exceptions import DoesNotExist
 
 from silvaengine_dynamodb_base import (
     BaseModel,
     delete_decorator,
-    insert_update_decorator,
     monitor_decorator,
-    resolve_list_decorator,
 )
-from silvaengine_utility import Serializer
 
+from ..handlers.instrumentation import instrument
+from ..handlers.retry_policy import dynamodb_retry
 from ..types.app_config import AppConfigListType, AppConfigType
-from .app import resolve_app_list
+from .app import AppModel
+from .pagination import resolve_cursor_list_decorator
+from .utils import (
+    ModelSerializer,
+    _exists_any,
+    _get_attributes_to_get,
+    app_config_cache,
+    insert_update_decorator,
+)
 
 class AppIdIndex(LocalSecondaryIndex):
     """
@@ -68,15 +75,28 @@ def create_app_config_table(logger: logging.Logger) -> bool:
     return True
 
 
-@retry(
-    reraise=True,
-    wait=wait_exponential(multiplier=1, max=60),
-    stop=stop_after_attempt(5),
-)
-def get_app_config(platform: str, app_id: str) -> AppConfigModel:
-    return AppConfigModel.get(platform, app_id)
+app_config_serializer = ModelSerializer(AppConfigModel, AppConfigType)
 
 
+@instrument
+@dynamodb_retry
+def get_app_config(
+    platform: str, app_id: str, attributes_to_get: Optional[List[str]] = None
+) -> AppConfigModel:
+    return AppConfigModel.get(platform, app_id, attributes_to_get=attributes_to_get)
+
+
+@instrument
+def _find_app_config(
+    platform: str, app_id: str, attributes_to_get: Optional[List[str]] = None
+) -> Optional[AppConfigModel]:
+    try:
+        return get_app_config(platform, app_id, attributes_to_get=attributes_to_get)
+    except DoesNotExist:
+        return None
+
+
+@instrument
 def get_app_config_count(platform: str, app_id: str) -> int:
     return AppConfigModel.count(
         platform, AppConfigModel.app_id == app_id
@@ -84,32 +104,34 @@ def get_app_config_count(platform: str, app_id: str) -> int:
 
 
 def get_app_config_type(info: ResolveInfo, app_config: AppConfigModel) -> AppConfigType:
-    
-    app_config = app_config.__dict__["attribute_values"]
-    return AppConfigType(**Serializer.json_normalize(app_config))
+    return app_config_serializer.to_type(app_config)
 
 
+@instrument
 def resolve_app_config(info: ResolveInfo, **kwargs: Dict[str, Any]) -> AppConfigType:
     # if "external_identifier" in kwargs:
     #     return get_app_type(
     #         info, _get_installed_app(kwargs["platform"], kwargs["external_identifier"])
     #     )
 
-    count = get_app_config_count(kwargs["platform"], kwargs["app_id"])
-    if count == 0:
+    app_config = _find_app_config(
+        kwargs["platform"],
+        kwargs["app_id"],
+        attributes_to_get=_get_attributes_to_get(info, AppConfigModel),
+    )
+    if app_config is None:
         return None
 
-    return get_app_config_type(
-        info,
-        get_app_config(kwargs["platform"], kwargs["app_id"]),
-    )
+    return get_app_config_type(info, app_config)
 
 
+@instrument
 @monitor_decorator
-@resolve_list_decorator(
+@resolve_cursor_list_decorator(
     attributes_to_get=["platform", "app_id"],
     list_type_class=AppConfigListType,
     type_funct=get_app_config_type,
+    model_class=AppConfigModel,
 )
 def resolve_app_config_list(info: ResolveInfo, **kwargs: Dict[str, Any]) -> Any:
     platform = kwargs.get("platform")
@@ -135,13 +157,14 @@ def resolve_app_config_list(info: ResolveInfo, **kwargs: Dict[str, Any]) -> Any:
     return inquiry_funct, count_funct, args
 
 
+@instrument
 @insert_update_decorator(
     keys={
         "hash_key": "platform",
         "range_key": "app_id",
     },
+    get_funct=_find_app_config,
     model_funct=get_app_config,
-    count_funct=get_app_config_count,
     type_funct=get_app_config_type,
     range_key_required=True
     # data_attributes_except_for_data_diff=["created_at", "updated_at"],
@@ -150,7 +173,6 @@ def resolve_app_config_list(info: ResolveInfo, **kwargs: Dict[str, Any]) -> Any:
 def insert_update_app_config(info: ResolveInfo, **kwargs: Dict[str, Any]) -> None:
     platform = kwargs.get("platform")
     app_id = kwargs.get("app_id")
-    print(kwargs)
     if kwargs.get("entity") is None:
         cols = {
             "configuration": kwargs.get("configuration"),
@@ -163,6 +185,8 @@ def insert_update_app_config(info: ResolveInfo, **kwargs: Dict[str, Any]) -> Non
             app_id,
             **cols,
         ).save()
+        # After the write, so a concurrent read can't cache the old row again.
+        app_config_cache.invalidate((platform, app_id))
         return
 
     app_config = kwargs.get("entity")
@@ -182,9 +206,11 @@ def insert_update_app_config(info: ResolveInfo, **kwargs: Dict[str, Any]) -> Non
 
     # Update the agent
     app_config.update(actions=actions)
+    app_config_cache.invalidate((platform, app_id))
     return
 
 
+@instrument
 @delete_decorator(
     keys={
         "hash_key": "platform",
@@ -193,17 +219,16 @@ def insert_update_app_config(info: ResolveInfo, **kwargs: Dict[str, Any]) -> Non
     model_funct=get_app_config,
 )
 def delete_app_config(info: ResolveInfo, **kwargs: Dict[str, Any]) -> bool:
-    installed_app_list = resolve_app_list(
-        info,
-        **{
-            "platform": kwargs["entity"].platform,
-            "app_id": kwargs["entity"].app_id,
-            "status": ["installed"]
-        },
-    )
-    if installed_app_list.total > 0:
+    if _exists_any(
+        AppModel.query,
+        kwargs["entity"].app_id,
+        filter_condition=(AppModel.platform == kwargs["entity"].platform)
+        & (AppModel.status == "installed"),
+        attributes_to_get=["app_id", "target_id"],
+    ):
         return False
 
     kwargs["entity"].delete()
+    app_config_cache.invalidate((kwargs["entity"].platform, kwargs["entity"].app_id))
 
     return True
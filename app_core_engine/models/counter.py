@@ -0,0 +1,260 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+from __future__ import print_function
+
+__author__ = "bibow"
+
+import collections
+import json
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+import pendulum
+from pynamodb.attributes import NumberAttribute, UnicodeAttribute, UTCDateTimeAttribute
+from pynamodb.exceptions import DoesNotExist, PutError, UpdateError
+
+from silvaengine_dynamodb_base import BaseModel
+
+from ..handlers.instrumentation import instrument
+from ..handlers.retry_policy import dynamodb_retry
+from .utils import _batch_write
+
+# Counter kinds: the table they count and the attributes that form a partition.
+COUNTER_KINDS = {
+    "apps:app_id": ("apps", ("app_id",)),
+    "apps:target_id,status": ("apps", ("target_id", "status")),
+    "threads:platform": ("threads", ("platform",)),
+    "threads:platform,user_id": ("threads", ("platform", "user_id")),
+}
+
+
+class Counters:
+    """
+    Materialized per-partition counters for the list totals.
+    Counters are created lazily by the first total that needs them (from a
+    real count) and then kept up to date with atomic ADDs by the mutations.
+    reconcile_counters repairs any drift.
+    """
+
+    enabled = False
+
+    @classmethod
+    def configure(cls, setting: Dict[str, Any]) -> None:
+        """
+        Apply counter settings.
+        Args:
+            setting (Dict[str, Any]): Configuration dictionary.
+        """
+        cls.enabled = bool(setting.get("counters_enabled", cls.enabled))
+
+
+class CounterModel(BaseModel):
+    class Meta(BaseModel.Meta):
+        table_name = "ace-counters"
+
+    key = UnicodeAttribute(hash_key=True)
+    kind = UnicodeAttribute()
+    # Stored as "count"; the attribute is named total so it doesn't shadow Model.count.
+    total = NumberAttribute(attr_name="count", default=0)
+    updated_at = UTCDateTimeAttribute()
+
+
+def create_counter_table(logger: logging.Logger) -> bool:
+    """Create the Counter table if it doesn't exist."""
+    if not CounterModel.exists():
+        # Create with on-demand billing (PAY_PER_REQUEST)
+        CounterModel.create_table(billing_mode="PAY_PER_REQUEST", wait=True)
+        logger.info("The Counter table has been created.")
+    return True
+
+
+def counter_key(kind: str, *values: Any) -> str:
+    return f"{kind}#{json.dumps(list(values), separators=(',', ':'))}"
+
+
+def counter_keys(table: str, entity: Any) -> List[str]:
+    """
+    Return the keys of every counter that counts entity.
+    """
+    return [
+        counter_key(kind, *[getattr(entity, name) for name in names])
+        for kind, (counted_table, names) in COUNTER_KINDS.items()
+        if counted_table == table
+    ]
+
+
+def _is_conditional_check_failed(error: Exception) -> bool:
+    return getattr(error, "cause_response_code", None) == "ConditionalCheckFailedException"
+
+
+@dynamodb_retry
+def _add_to_counter(key: str, delta: int) -> None:
+    CounterModel(key).update(
+        actions=[
+            CounterModel.total.add(delta),
+            CounterModel.updated_at.set(pendulum.now("UTC")),
+        ],
+        # Counters that were never read are not created by increments; the
+        # first read initializes them from a real count.
+        condition=CounterModel.key.exists(),
+    )
+
+
+@instrument
+def update_counters(deltas: Dict[str, int], logger: Optional[logging.Logger] = None) -> None:
+    """
+    Apply the deltas to existing counters with atomic ADDs.
+    A failed update only leaves drift for reconcile_counters, so it is logged
+    rather than failing the mutation that already wrote its item.
+    Args:
+        deltas (Dict[str, int]): Counter key to increment (negative to decrement).
+        logger (logging.Logger): Optional logger for failed updates.
+    """
+    if not Counters.enabled:
+        return
+    for key, delta in deltas.items():
+        if not delta:
+            continue
+        try:
+            _add_to_counter(key, delta)
+        except UpdateError as e:
+            if _is_conditional_check_failed(e):
+                continue
+            if logger is not None:
+                logger.warning(f"Failed to update counter {key}.", exc_info=True)
+        except Exception:
+            if logger is not None:
+                logger.warning(f"Failed to update counter {key}.", exc_info=True)
+
+
+@instrument
+@dynamodb_retry
+def _get_counter(key: str) -> Optional[CounterModel]:
+    try:
+        return CounterModel.get(key)
+    except DoesNotExist:
+        return None
+
+
+def counted(kind: str, values: Iterable[Any], count_funct: Callable[..., int]) -> Callable[..., int]:
+    """
+    Wrap a list resolver's count_funct so the total is read from the
+    materialized counter for (kind, values). A missing counter is initialized
+    from count_funct. Falls back to count_funct when counters are disabled.
+    """
+    key = counter_key(kind, *values)
+
+    def funct(*args: Any, **kwargs: Any) -> int:
+        if not Counters.enabled:
+            return count_funct(*args, **kwargs)
+
+        counter = _get_counter(key)
+        if counter is not None:
+            return max(int(counter.total), 0)
+
+        count = count_funct(*args, **kwargs)
+        try:
+            CounterModel(
+                key, kind=kind, total=count, updated_at=pendulum.now("UTC")
+            ).save(condition=CounterModel.key.does_not_exist())
+        except PutError as e:
+            # Another request initialized it first.
+            if not _is_conditional_check_failed(e):
+                raise e
+        return count
+
+    funct.__name__ = getattr(count_funct, "__name__", "count")
+    return funct
+
+
+@instrument
+def invalidate_counters(keys: Iterable[str]) -> None:
+    """
+    Delete counters so their next read recounts them, e.g. after a bulk load
+    that may have overwritten items.
+    """
+    with CounterModel.batch_write() as batch:
+        for key in keys:
+            batch.delete(CounterModel(key))
+
+
+def reconcile_counters(
+    kinds: Optional[List[str]] = None,
+    total_segments: int = 1,
+    logger: Optional[logging.Logger] = None,
+) -> Dict[str, Any]:
+    """
+    Recount the partitions of the given counter kinds (all by default) with
+    one projected scan per source table, and rewrite every counter that
+    drifted. Writes that land during the scan can leave a difference of a
+    few items, which the next run corrects.
+    Args:
+        kinds (List[str]): Counter kinds to repair, keys of COUNTER_KINDS.
+        total_segments (int): Parallel scan segments per source table.
+        logger (logging.Logger): Optional logger for the summary.
+    Returns:
+        Dict with the partitions checked and corrected per kind.
+    """
+    from .app import AppModel
+    from .thread import ThreadModel
+
+    kinds = kinds or list(COUNTER_KINDS)
+    unknown = [kind for kind in kinds if kind not in COUNTER_KINDS]
+    if unknown:
+        raise Exception(f"Unknown counter kinds: {', '.join(unknown)}")
+
+    start = time.perf_counter()
+    tables = {"apps": AppModel, "threads": ThreadModel}
+    actual = {kind: collections.Counter() for kind in kinds}
+    for table, model_class in tables.items():
+        table_kinds = [kind for kind in kinds if COUNTER_KINDS[kind][0] == table]
+        if not table_kinds:
+            continue
+        names = sorted({name for kind in table_kinds for name in COUNTER_KINDS[kind][1]})
+
+        def count_segment(segment: Optional[int]) -> Dict[str, collections.Counter]:
+            counts = {kind: collections.Counter() for kind in table_kinds}
+            for entity in model_class.scan(
+                segment=segment,
+                total_segments=total_segments if segment is not None else None,
+                attributes_to_get=names,
+            ):
+                for kind in table_kinds:
+                    counts[kind][
+                        counter_key(
+                            kind,
+                            *[getattr(entity, name) for name in COUNTER_KINDS[kind][1]],
+                        )
+                    ] += 1
+            return counts
+
+        segments = list(range(total_segments)) if total_segments > 1 else [None]
+        with ThreadPoolExecutor(max_workers=len(segments)) as executor:
+            for counts in executor.map(count_segment, segments):
+                for kind, counter in counts.items():
+                    actual[kind].update(counter)
+
+    stored = {kind: {} for kind in kinds}
+    for counter in CounterModel.scan(CounterModel.kind.is_in(*kinds)):
+        stored[counter.kind][counter.key] = int(counter.total)
+
+    now = pendulum.now("UTC")
+    summary = {"kinds": {}}
+    for kind in kinds:
+        corrected = [
+            CounterModel(key, kind=kind, total=actual[kind].get(key, 0), updated_at=now)
+            for key in set(actual[kind]) | set(stored[kind])
+            if stored[kind].get(key) != actual[kind].get(key, 0)
+        ]
+        errors = _batch_write(CounterModel, corrected)
+        summary["kinds"][kind] = {
+            "partitions": len(actual[kind]),
+            "corrected": sum(1 for error in errors if error is None),
+            "failed": sum(1 for error in errors if error is not None),
+        }
+    summary["seconds"] = round(time.perf_counter() - start, 3)
+    if logger is not None:
+        logger.info(f"Reconciled counters: {json.dumps(summary)}")
+    return summary
@@ -0,0 +1,156 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+from __future__ import print_function
+
+__author__ = "bibow"
+
+import base64
+import functools
+import json
+from typing import Any, Callable, Dict, List, Optional
+
+from graphene import List as GrapheneList
+from graphene import ResolveInfo
+
+from silvaengine_dynamodb_base import resolve_list_decorator
+
+from .query_plan import QueryPlanner, plan_list_query
+from .utils import _get_attributes_to_get, _project
+
+DEFAULT_PAGE_SIZE = 100
+
+
+def encode_cursor(last_evaluated_key: Optional[Dict[str, Any]]) -> Optional[str]:
+    if last_evaluated_key is None:
+        return None
+    return base64.urlsafe_b64encode(
+        json.dumps(last_evaluated_key, separators=(",", ":"), sort_keys=True).encode()
+    ).decode()
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[Dict[str, Any]]:
+    if not cursor:
+        return None
+    try:
+        last_evaluated_key = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+    except (ValueError, TypeError):
+        raise Exception(f"Invalid cursor: {cursor}")
+    # Valid JSON that is not a key (e.g. a list) is as invalid as garbage.
+    if not isinstance(last_evaluated_key, dict):
+        raise Exception(f"Invalid cursor: {cursor}")
+    return last_evaluated_key
+
+
+def _get_list_field_name(list_type_class: Any) -> str:
+    for name, field in list_type_class._meta.fields.items():
+        if isinstance(field.type, GrapheneList):
+            return name
+    raise Exception(f"{list_type_class.__name__} has no list field.")
+
+
+def _count(inquiry_funct: Callable, count_funct: Callable, args: List[Any]) -> int:
+    if getattr(inquiry_funct, "__name__", None) == "scan":
+        # Model.count() without a hash key can't take a filter, so count the scan.
+        if args and args[0] is not None:
+            return sum(1 for _ in inquiry_funct(*args))
+        return count_funct()
+    return count_funct(*args)
+
+
+def resolve_cursor_list_decorator(
+    attributes_to_get: List[str],
+    list_type_class: Any,
+    type_funct: Callable,
+    model_class: Any = None,
+    requires: Optional[Dict[str, List[str]]] = None,
+) -> Callable:
+    """
+    Extend resolve_list_decorator with an opaque cursor mode.
+
+    When `after` or `first` is given, the decorated function's
+    (inquiry_funct, count_funct, args) is run for a single page starting at the
+    decoded `last_evaluated_key`, so page N costs the same as page 1. The total
+    is only counted when `with_total` is set. Otherwise the call is handed to
+    resolve_list_decorator unchanged (page_number/limit mode).
+
+    With model_class set, both modes read only the attributes the rows'
+    selection asks for (see _get_attributes_to_get).
+
+    Every request is first checked by the query planner (see
+    plan_list_query), which may cap the page or reject it.
+    """
+
+    def actual_decorator(original_function: Callable) -> Callable:
+        list_field_name = _get_list_field_name(list_type_class)
+
+        @functools.wraps(original_function)
+        def projected_function(info: ResolveInfo, **kwargs: Dict[str, Any]) -> Any:
+            inquiry_funct, count_funct, args = original_function(info, **kwargs)
+            if model_class is not None:
+                # Index.query is bound to the index; Model.query/scan to the class.
+                index = getattr(inquiry_funct, "__self__", None)
+                inquiry_funct = _project(
+                    inquiry_funct,
+                    _get_attributes_to_get(
+                        info,
+                        model_class,
+                        (list_field_name,),
+                        requires,
+                        index=None if isinstance(index, type) else index,
+                    ),
+                )
+            return inquiry_funct, count_funct, args
+
+        offset_resolver = resolve_list_decorator(
+            attributes_to_get=attributes_to_get,
+            list_type_class=list_type_class,
+            type_funct=type_funct,
+        )(projected_function)
+
+        @functools.wraps(original_function)
+        def list_resolver(info: ResolveInfo, **kwargs: Dict[str, Any]) -> Any:
+            cursor_mode = kwargs.get("after") is not None or kwargs.get("first") is not None
+            if QueryPlanner.enabled:
+                inquiry_funct, _, args = original_function(info, **kwargs)
+                plan_list_query(
+                    info,
+                    inquiry_funct,
+                    args,
+                    kwargs,
+                    page_size_arg="first" if cursor_mode else "limit",
+                    default_page_size=DEFAULT_PAGE_SIZE,
+                )
+            else:
+                kwargs.pop("allow_scan", None)
+
+            if not cursor_mode:
+                return offset_resolver(info, **kwargs)
+
+            first = kwargs.get("first") or DEFAULT_PAGE_SIZE
+            inquiry_funct, count_funct, args = projected_function(info, **kwargs)
+
+            results = inquiry_funct(
+                *args,
+                limit=first,
+                last_evaluated_key=decode_cursor(kwargs.get("after")),
+            )
+            entities = [type_funct(info, entity) for entity in results]
+            last_evaluated_key = results.last_evaluated_key
+
+            total = None
+            if kwargs.get("with_total"):
+                total = _count(inquiry_funct, count_funct, args)
+
+            return list_type_class(
+                **{
+                    list_field_name: entities,
+                    "page_size": first,
+                    "total": total,
+                    "end_cursor": encode_cursor(last_evaluated_key),
+                    "has_next_page": last_evaluated_key is not None,
+                }
+            )
+
+        return list_resolver
+
+    return actual_decorator
@@ -0,0 +1,260 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+from __future__ import print_function
+
+__author__ = "bibow"
+
+import math
+from typing import Any, Callable, Dict, List
+
+from graphene import ResolveInfo
+
+from ..handlers.cache import MISSING, TTLCache
+
+# Plan types, cheapest first.
+KEY_LOOKUP = "key_lookup"
+INDEX_QUERY = "index_query"
+FILTERED_QUERY = "filtered_query"
+SCAN = "scan"
+
+ALLOW = "allow"
+CAP = "cap"
+REQUIRE_ALLOW_SCAN = "require_allow_scan"
+REJECT = "reject"
+POLICIES = (ALLOW, CAP, REQUIRE_ALLOW_SCAN, REJECT)
+
+# Used when DescribeTable is unavailable or the table is still empty.
+DEFAULT_ITEM_SIZE = 1024
+
+# DescribeTable item counts are refreshed by DynamoDB about every six hours.
+table_stats_cache = TTLCache(max_size=16, ttl=3600.0)
+
+
+class QueryPlanner:
+    """
+    Classifies list requests, estimates their read cost and applies the
+    configured policy to scans and filtered queries before they run.
+    """
+
+    # Off unless configured: planning costs a DescribeTable per table and adds
+    # extensions.queryPlans to every list response.
+    enabled = False
+    scan_policy = ALLOW
+    filtered_policy = ALLOW
+    max_page_size = 100
+    # Reject plans estimated above this many read capacity units (None: no limit).
+    max_estimated_rcu = None
+    # Items assumed to be read per returned item when a filter is applied.
+    filter_read_factor = 10
+
+    @classmethod
+    def configure(cls, setting: Dict[str, Any]) -> None:
+        """
+        Apply query planner settings.
+        Args:
+            setting (Dict[str, Any]): Configuration dictionary.
+        """
+        cls.scan_policy = cls._get_policy(setting, "query_scan_policy", cls.scan_policy)
+        cls.filtered_policy = cls._get_policy(
+            setting, "query_filtered_policy", cls.filtered_policy
+        )
+        cls.max_page_size = int(setting.get("query_max_page_size", cls.max_page_size))
+        max_estimated_rcu = setting.get("query_max_estimated_rcu", cls.max_estimated_rcu)
+        cls.max_estimated_rcu = (
+            float(max_estimated_rcu) if max_estimated_rcu is not None else None
+        )
+        cls.filter_read_factor = int(
+            setting.get("query_filter_read_factor", cls.filter_read_factor)
+        )
+        # Configuring a policy or a limit turns the planner on.
+        enforced = (
+            cls.scan_policy != ALLOW
+            or cls.filtered_policy != ALLOW
+            or cls.max_estimated_rcu is not None
+        )
+        cls.enabled = bool(setting.get("query_planner_enabled", cls.enabled or enforced))
+
+    @staticmethod
+    def _get_policy(setting: Dict[str, Any], key: str, default: str) -> str:
+        policy = setting.get(key, default)
+        if policy not in POLICIES:
+            raise Exception(f"{key} must be one of {', '.join(POLICIES)}, not {policy}.")
+        return policy
+
+    @classmethod
+    def get_policy(cls, plan_type: str) -> str:
+        if plan_type == SCAN:
+            return cls.scan_policy
+        if plan_type == FILTERED_QUERY:
+            return cls.filtered_policy
+        return ALLOW
+
+
+def _get_table_stats(model_class: Any) -> Dict[str, int]:
+    """
+    Return the approximate item count and average item size of a table.
+    """
+    table_name = model_class.Meta.table_name
+    stats = table_stats_cache.get(table_name)
+    if stats is not MISSING:
+        return stats
+
+    try:
+        description = model_class.describe_table()
+        item_count = int(description.get("ItemCount", 0))
+        table_size = int(description.get("TableSizeBytes", 0))
+        stats = {
+            "item_count": item_count,
+            "item_size": table_size // item_count if item_count else DEFAULT_ITEM_SIZE,
+        }
+    except Exception:
+        # Missing dynamodb:DescribeTable permission must not break list queries.
+        stats = {"item_count": None, "item_size": DEFAULT_ITEM_SIZE}
+    table_stats_cache.set(table_name, stats)
+    return stats
+
+
+def classify(inquiry_funct: Callable, args: List[Any]) -> Dict[str, Any]:
+    """
+    Describe what the (inquiry_funct, args) of a resolve_*_list function
+    will do in DynamoDB: the table, the index and the plan type.
+    """
+    owner = inquiry_funct.__self__
+    if inquiry_funct.__name__ == "scan":
+        return {
+            "type": SCAN,
+            "model_class": owner,
+            "table": owner.Meta.table_name,
+            "index": None,
+            "filtered": bool(args and args[0] is not None),
+        }
+
+    range_key_condition = args[1] if len(args) > 1 else None
+    filtered = len(args) > 2 and args[2] is not None
+    if isinstance(owner, type):
+        model_class, index_name = owner, None
+        key_names = {owner._hash_keyname, owner._range_keyname}
+    else:
+        model_class, index_name = owner._model, owner.Meta.index_name
+        key_names = {
+            name
+            for name, attribute in owner.Meta.attributes.items()
+            if attribute.is_hash_key or attribute.is_range_key
+        }
+    # An equality on the sort key pins one item when the table or index is
+    # keyed like the table itself (the table, or an LSI on its sort key).
+    unique_keys = model_class._range_keyname is not None and key_names == {
+        model_class._hash_keyname,
+        model_class._range_keyname,
+    }
+
+    if filtered:
+        plan_type = FILTERED_QUERY
+    elif unique_keys and getattr(range_key_condition, "operator", None) == "=":
+        plan_type = KEY_LOOKUP
+    else:
+        plan_type = INDEX_QUERY
+    return {
+        "type": plan_type,
+        "model_class": model_class,
+        "table": model_class.Meta.table_name,
+        "index": index_name,
+        "filtered": filtered,
+    }
+
+
+def estimate(plan: Dict[str, Any], page_size: int, pages: int, with_total: bool) -> None:
+    """
+    Add estimated_items and estimated_rcu (eventually consistent reads) to plan.
+    Filtered reads assume filter_read_factor items read per item returned;
+    scans are bounded by the table size, and counting a scan reads it all.
+    """
+    stats = _get_table_stats(plan["model_class"])
+    item_count = stats["item_count"]
+
+    if plan["type"] == KEY_LOOKUP:
+        items = 1
+    elif plan["filtered"]:
+        items = page_size * pages * QueryPlanner.filter_read_factor
+    else:
+        items = page_size * pages
+    if plan["type"] == SCAN and item_count is not None:
+        items = min(items, item_count)
+        if with_total:
+            items += item_count
+
+    plan["estimated_items"] = items
+    plan["estimated_rcu"] = max(
+        math.ceil(items * stats["item_size"] / 4096 / 2 * 10) / 10, 0.5
+    )
+
+
+def plan_list_query(
+    info: ResolveInfo,
+    inquiry_funct: Callable,
+    args: List[Any],
+    kwargs: Dict[str, Any],
+    page_size_arg: str,
+    default_page_size: int,
+) -> Dict[str, Any]:
+    """
+    Plan one list request and apply the policy for its type; kwargs are
+    capped in place. Raises if the request is rejected. The plan is recorded
+    in info.context["query_plans"] and returned in the response extensions.
+    Args:
+        inquiry_funct (Callable): The scan or query the resolver will run.
+        args (List[Any]): Its positional arguments.
+        kwargs (Dict[str, Any]): The list field's arguments.
+        page_size_arg (str): "first" (cursor mode) or "limit" (offset mode).
+        default_page_size (int): Page size when the argument is not given.
+    """
+    allow_scan = bool(kwargs.pop("allow_scan", False))
+    plan = classify(inquiry_funct, args)
+    policy = QueryPlanner.get_policy(plan["type"])
+    page_size = kwargs.get(page_size_arg) or default_page_size
+    pages = 1 if page_size_arg == "first" else max(kwargs.get("page_number") or 1, 1)
+
+    action = ALLOW
+    if policy == REJECT:
+        action = REJECT
+    elif policy == REQUIRE_ALLOW_SCAN and not allow_scan:
+        action = REJECT
+    elif policy == CAP and not allow_scan:
+        if page_size > QueryPlanner.max_page_size:
+            page_size = kwargs[page_size_arg] = QueryPlanner.max_page_size
+            action = CAP
+        if plan["type"] == SCAN and kwargs.get("with_total"):
+            # Counting a scan reads the whole table.
+            kwargs["with_total"] = False
+            action = CAP
+
+    estimate(plan, page_size, pages, bool(kwargs.get("with_total")))
+    if (
+        action != REJECT
+        and not allow_scan
+        and QueryPlanner.max_estimated_rcu is not None
+        and plan["estimated_rcu"] > QueryPlanner.max_estimated_rcu
+    ):
+        action = REJECT
+
+    plan = {
+        "field": info.field_name,
+        "type": plan["type"],
+        "table": plan["table"],
+        "index": plan["index"],
+        "filtered": plan["filtered"],
+        "page_size": page_size,
+        "estimated_items": plan["estimated_items"],
+        "estimated_rcu": plan["estimated_rcu"],
+        "allow_scan": allow_scan,
+        "action": action,
+    }
+    info.context.setdefault("query_plans", []).append(plan)
+
+    if action == REJECT:
+        raise Exception(
+            f"{info.field_name} was rejected by the query planner ({plan['type']} "
+            f"on {plan['table']}, estimated at {plan['estimated_rcu']} RCU). "
+            "Narrow it with key arguments or pass allowScan: true."
+        )
+    return plan
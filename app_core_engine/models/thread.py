@@ -6,24 +6,31 @@ __author__ = "bibow"
 
 import logging
 import traceback
-from typing import Any, Dict
+from typing import Any, Dict, List, Optional
 
 import pendulum
 from graphene import ResolveInfo
 from pynamodb.attributes import UnicodeAttribute, UTCDateTimeAttribute
-from pynamodb.indexes import AllProjection, LocalSecondaryIndex
-from tenacity import retry, stop_after_attempt, wait_exponential
+from pynamodb.indexes import AllProjection, GlobalSecondaryIndex, LocalSecondaryIndex
+from pynamodb.exceptions import DoesNotExist
 
 from silvaengine_dynamodb_base import (
     BaseModel,
     delete_decorator,
-    insert_update_decorator,
     monitor_decorator,
-    resolve_list_decorator,
 )
-from silvaengine_utility import Serializer
 
-from ..types.thread import ThreadListType, ThreadType
+from ..handlers.instrumentation import instrument
+from ..handlers.retry_policy import dynamodb_retry
+from ..types.thread import InsertThreadResultType, ThreadListType, ThreadType
+from .counter import counted, counter_keys, update_counters
+from .pagination import resolve_cursor_list_decorator
+from .utils import (
+    ModelSerializer,
+    _batch_write,
+    _get_attributes_to_get,
+    insert_update_decorator,
+)
 
 
 class UserIdIndex(LocalSecondaryIndex):
@@ -41,6 +48,36 @@ class UserIdIndex(LocalSecondaryIndex):
     user_id = UnicodeAttribute(range_key=True)
 
 
+class PlatformCreatedAtIndex(GlobalSecondaryIndex):
+    """
+    This class represents a global secondary index
+    """
+
+    class Meta:
+        billing_mode = "PAY_PER_REQUEST"
+        # All attributes are projected
+        projection = AllProjection()
+        index_name = "platform-created_at-index"
+
+    platform = UnicodeAttribute(hash_key=True)
+    created_at = UTCDateTimeAttribute(range_key=True)
+
+
+class AppIdCreatedAtIndex(GlobalSecondaryIndex):
+    """
+    This class represents a global secondary index
+    """
+
+    class Meta:
+        billing_mode = "PAY_PER_REQUEST"
+        # All attributes are projected
+        projection = AllProjection()
+        index_name = "app_id-created_at-index"
+
+    app_id = UnicodeAttribute(hash_key=True)
+    created_at = UTCDateTimeAttribute(range_key=True)
+
+
 class ThreadModel(BaseModel):
     class Meta(BaseModel.Meta):
         table_name = "ace-threads"
@@ -51,6 +88,8 @@ class ThreadModel(BaseModel):
     user_id = UnicodeAttribute()
     created_at = UTCDateTimeAttribute()
     user_id_index = UserIdIndex()
+    platform_created_at_index = PlatformCreatedAtIndex()
+    app_id_created_at_index = AppIdCreatedAtIndex()
 
 
 def create_thread_table(logger: logging.Logger) -> bool:
@@ -62,39 +101,56 @@ def create_thread_table(logger: logging.Logger) -> bool:
     return True
 
 
-@retry(
-    reraise=True,
-    wait=wait_exponential(multiplier=1, max=60),
-    stop=stop_after_attempt(5),
-)
-def get_thread(platform: str, thread_uuid: str) -> ThreadModel:
-    return ThreadModel.get(platform, thread_uuid)
+thread_serializer = ModelSerializer(ThreadModel, ThreadType)
+
+
+@instrument
+@dynamodb_retry
+def get_thread(
+    platform: str, thread_uuid: str, attributes_to_get: Optional[List[str]] = None
+) -> ThreadModel:
+    return ThreadModel.get(platform, thread_uuid, attributes_to_get=attributes_to_get)
+
+
+@instrument
+def _find_thread(
+    platform: str, thread_uuid: str, attributes_to_get: Optional[List[str]] = None
+) -> Optional[ThreadModel]:
+    try:
+        return get_thread(platform, thread_uuid, attributes_to_get=attributes_to_get)
+    except DoesNotExist:
+        return None
 
 
+@instrument
 def get_thread_count(platform: str, thread_uuid: str) -> int:
     return ThreadModel.count(platform, ThreadModel.thread_uuid == thread_uuid)
 
 
 def get_thread_type(info: ResolveInfo, thread: ThreadModel) -> ThreadType:
-    thread = thread.__dict__["attribute_values"]
-    return ThreadType(**Serializer.json_normalize(thread))
+    return thread_serializer.to_type(thread)
 
 
+@instrument
 def resolve_thread(info: ResolveInfo, **kwargs: Dict[str, Any]) -> ThreadType:
-    count = get_thread_count(kwargs["platform"], kwargs["thread_uuid"])
-    if count == 0:
+    thread = _find_thread(
+        kwargs["platform"],
+        kwargs["thread_uuid"],
+        attributes_to_get=_get_attributes_to_get(info, ThreadModel),
+    )
+    if thread is None:
         return None
 
-    return get_thread_type(
-        info, get_thread(kwargs["platform"], kwargs["thread_uuid"])
-    )
+    return get_thread_type(info, thread)
 
 
+@instrument
 @monitor_decorator
-@resolve_list_decorator(
+@resolve_cursor_list_decorator(
     attributes_to_get=["platform", "thread_uuid", "app_id", "user_id"],
     list_type_class=ThreadListType,
     type_funct=get_thread_type,
+    model_class=ThreadModel,
 )
 def resolve_thread_list(info: ResolveInfo, **kwargs: Dict[str, Any]) -> Any:
     platform = kwargs["platform"]
@@ -104,6 +160,7 @@ def resolve_thread_list(info: ResolveInfo, **kwargs: Dict[str, Any]) -> Any:
     args = []
     inquiry_funct = ThreadModel.scan
     count_funct = ThreadModel.count
+    the_filters = None  # We can add filters for the query.
     if platform:
         args = [platform, None]
         inquiry_funct = ThreadModel.query
@@ -111,8 +168,22 @@ def resolve_thread_list(info: ResolveInfo, **kwargs: Dict[str, Any]) -> Any:
             inquiry_funct = ThreadModel.user_id_index.query
             args[1] = ThreadModel.user_id == user_id
             count_funct = ThreadModel.user_id_index.count
+        elif app_id or created_at:
+            # created_at is the range key of both GSIs, so the time window
+            # becomes a key condition instead of a post-read filter.
+            if app_id:
+                index = ThreadModel.app_id_created_at_index
+                args = [app_id, None]
+                the_filters &= ThreadModel.platform == platform
+                app_id = None
+            else:
+                index = ThreadModel.platform_created_at_index
+            if created_at:
+                args[1] = ThreadModel.created_at >= created_at
+                created_at = None
+            inquiry_funct = index.query
+            count_funct = index.count
 
-    the_filters = None  # We can add filters for the query.
     if created_at:
         the_filters &= ThreadModel.created_at >= created_at
     
@@ -122,16 +193,26 @@ def resolve_thread_list(info: ResolveInfo, **kwargs: Dict[str, Any]) -> Any:
     if the_filters is not None:
         args.append(the_filters)
 
+    # Totals of whole platform / user partitions come from materialized counters.
+    if platform and not kwargs.get("app_id") and not kwargs.get("created_at"):
+        if user_id:
+            count_funct = counted(
+                "threads:platform,user_id", (platform, user_id), count_funct
+            )
+        else:
+            count_funct = counted("threads:platform", (platform,), count_funct)
+
     return inquiry_funct, count_funct, args
 
 
+@instrument
 @insert_update_decorator(
     keys={
         "hash_key": "platform",
         "range_key": "thread_uuid",
     },
+    get_funct=_find_thread,
     model_funct=get_thread,
-    count_funct=get_thread_count,
     type_funct=get_thread_type,
     range_key_required=True
     # data_attributes_except_for_data_diff=["created_at", "updated_at"],
@@ -148,15 +229,84 @@ def insert_thread(info: ResolveInfo, **kwargs: Dict[str, Any]) -> None:
             if key in kwargs:
                 cols[key] = kwargs[key]
 
-        ThreadModel(
+        thread = ThreadModel(
             platform,
             thread_uuid,
             **cols,
-        ).save()
+        )
+        thread.save()
+        update_counters(
+            {key: 1 for key in counter_keys("threads", thread)},
+            logger=info.context.get("logger"),
+        )
         return
     return
 
 
+@instrument
+def insert_threads(
+    info: ResolveInfo, **kwargs: Dict[str, Any]
+) -> List[InsertThreadResultType]:
+    threads = kwargs.get("threads") or []
+    results = [
+        InsertThreadResultType(
+            platform=thread["platform"], thread_uuid=thread["thread_uuid"]
+        )
+        for thread in threads
+    ]
+
+    # Like insert_thread, existing threads are returned as they are.
+    keys = {(thread["platform"], thread["thread_uuid"]) for thread in threads}
+    existing = {
+        (thread.platform, thread.thread_uuid): thread
+        for thread in ThreadModel.batch_get(list(keys))
+    }
+
+    created_at = pendulum.now("UTC")
+    positions, entities, seen = [], [], set()
+    for position, thread in enumerate(threads):
+        key = (thread["platform"], thread["thread_uuid"])
+        if key in existing:
+            results[position].ok = True
+            results[position].thread = get_thread_type(info, existing[key])
+            continue
+        if key in seen:
+            results[position].ok = False
+            results[position].error = "Duplicate thread in request."
+            continue
+        seen.add(key)
+        positions.append(position)
+        entities.append(
+            ThreadModel(
+                thread["platform"],
+                thread["thread_uuid"],
+                app_id=thread.get("app_id"),
+                user_id=thread.get("user_id"),
+                created_at=created_at,
+            )
+        )
+
+    try:
+        errors = _batch_write(ThreadModel, entities)
+    except Exception as e:
+        log = traceback.format_exc()
+        info.context.get("logger").error(log)
+        raise e
+
+    deltas = {}
+    for position, entity, error in zip(positions, entities, errors):
+        results[position].ok = error is None
+        results[position].error = error
+        if error is None:
+            results[position].thread = get_thread_type(info, entity)
+            for key in counter_keys("threads", entity):
+                deltas[key] = deltas.get(key, 0) + 1
+    update_counters(deltas, logger=info.context.get("logger"))
+
+    return results
+
+
+@instrument
 @delete_decorator(
     keys={
         "hash_key": "platform",
@@ -166,4 +316,8 @@ def insert_thread(info: ResolveInfo, **kwargs: Dict[str, Any]) -> None:
 )
 def delete_thread(info: ResolveInfo, **kwargs: Dict[str, Any]) -> bool:
     kwargs["entity"].delete()
+    update_counters(
+        {key: -1 for key in counter_keys("threads", kwargs["entity"])},
+        logger=info.context.get("logger"),
+    )
     return True
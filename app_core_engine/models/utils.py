@@ -3,28 +3,443 @@ from __future__ import print_function
 
 __author__ = "bibow"
 
+import functools
+import json
 import logging
-from typing import Any, Dict, List
+import threading
+import time
+from decimal import Decimal
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+from graphene.utils.str_converters import to_camel_case, to_snake_case
+from graphql import FieldNode, FragmentSpreadNode, InlineFragmentNode
+from pynamodb.attributes import ListAttribute, MapAttribute
+from silvaengine_dynamodb_base import insert_update_decorator as base_insert_update_decorator
+from silvaengine_utility import Serializer
+
+from ..handlers.cache import TTLCache
+from ..handlers.instrumentation import instrument
+from ..handlers.retry_policy import RetryPolicy, dynamodb_retry, is_transient_error
+
+# DynamoDB limit on the number of requests in one BatchWriteItem call.
+BATCH_WRITE_LIMIT = 25
+# Page size used by _exists_any when a filter is applied after the read.
+EXISTS_FILTERED_PAGE_SIZE = 100
+
+# Process-wide read-through cache of app configs keyed by (platform, app_id).
+# Missing configs are cached as None. Sized and timed by Config.
+app_config_cache = TTLCache(max_size=256, ttl=300.0)
+
+# Process-wide cache of installed-app token records keyed by (app_id, target_id).
+# "Not installed" is cached as None for a shorter time. Sized and timed by Config.
+installed_app_cache = TTLCache(max_size=1024, ttl=60.0, negative_ttl=10.0)
 
 
 def _initialize_tables(logger: logging.Logger) -> None:
     from .app import create_app_table
     from .thread import create_thread_table
     from .app_config import create_app_config_table
+    from .counter import create_counter_table
 
     create_app_table(logger)
     create_thread_table(logger)
     create_app_config_table(logger)
+    create_counter_table(logger)
+
+def _iter_field_nodes(info: Any, node: Any) -> Iterator[FieldNode]:
+    """
+    Yield the fields selected directly under node, expanding fragments.
+    """
+    if node.selection_set is None:
+        return
+    for selection in node.selection_set.selections:
+        if isinstance(selection, FieldNode):
+            yield selection
+        elif isinstance(selection, InlineFragmentNode):
+            yield from _iter_field_nodes(info, selection)
+        elif isinstance(selection, FragmentSpreadNode):
+            fragment = info.fragments.get(selection.name.value)
+            if fragment is not None:
+                yield from _iter_field_nodes(info, fragment)
+
+
+def _get_selected_fields(info: Any, path: Tuple[str, ...] = ()) -> Optional[Set[str]]:
+    """
+    Return the snake_case names of the fields selected at path below the
+    field being resolved, e.g. path=("app_list",) for the rows of an AppListType.
+    Returns None when the selection is unknown, meaning "everything".
+    Results are kept in the request context since list type functions ask
+    once per row.
+    """
+    if info is None or not getattr(info, "field_nodes", None):
+        return None
+    cache = (
+        info.context.setdefault("selected_fields", {})
+        if isinstance(info.context, dict)
+        else {}
+    )
+    key = (id(info.field_nodes[0]), path)
+    if key in cache:
+        return cache[key]
+
+    nodes = list(info.field_nodes)
+    for name in path:
+        name = to_camel_case(name)
+        nodes = [
+            child
+            for node in nodes
+            for child in _iter_field_nodes(info, node)
+            if child.name.value == name
+        ]
+
+    fields = None
+    if nodes:
+        fields = {
+            to_snake_case(child.name.value)
+            for node in nodes
+            for child in _iter_field_nodes(info, node)
+            if not child.name.value.startswith("__")
+        }
+    cache[key] = fields
+    return fields
+
+
+def _is_selected(info: Any, field_name: str) -> bool:
+    """
+    Return True if field_name is selected anywhere below the field being
+    resolved, or if the selection is unknown.
+    """
+    if info is None or not getattr(info, "field_nodes", None):
+        return True
+    cache = (
+        info.context.setdefault("selected_fields", {})
+        if isinstance(info.context, dict)
+        else {}
+    )
+    key = (id(info.field_nodes[0]), "*")
+    names = cache.get(key)
+    if names is None:
+        names, nodes = set(), list(info.field_nodes)
+        while nodes:
+            for child in _iter_field_nodes(info, nodes.pop()):
+                names.add(to_snake_case(child.name.value))
+                nodes.append(child)
+        cache[key] = names
+    return field_name in names
+
+
+def _get_attributes_to_get(
+    info: Any,
+    model_class: Any,
+    path: Tuple[str, ...] = (),
+    requires: Optional[Dict[str, List[str]]] = None,
+    index: Any = None,
+) -> Optional[List[str]]:
+    """
+    Map the GraphQL selection at path to the model attributes to read.
+    The table keys, and the keys of the index being queried, are always read;
+    pynamodb needs them to build last_evaluated_key when a page ends early.
+    requires lists the attributes that a computed field (such as app_config)
+    needs. Returns None, i.e. read the whole item, when the selection is
+    unknown or covers every attribute.
+    Args:
+        info: The GraphQL resolve info.
+        model_class: The pynamodb model class being read.
+        path (Tuple[str, ...]): Field names from the resolved field to the item type.
+        requires (Dict[str, List[str]]): Attributes needed by non-attribute fields.
+        index: The pynamodb index being queried, if any.
+    """
+    fields = _get_selected_fields(info, path)
+    if fields is None:
+        return None
+
+    attributes = model_class.get_attributes()
+    names = {model_class._hash_key_attribute().attr_name}
+    if model_class._range_key_attribute() is not None:
+        names.add(model_class._range_key_attribute().attr_name)
+    if index is not None:
+        names.update(
+            attribute.attr_name
+            for attribute in index.Meta.attributes.values()
+            if attribute.is_hash_key or attribute.is_range_key
+        )
+    for field in fields:
+        for name in [field] + (requires or {}).get(field, []):
+            if name in attributes:
+                names.add(attributes[name].attr_name)
+
+    if len(names) >= len(attributes):
+        return None
+    return sorted(names)
+
+
+def _project(inquiry_funct: Callable[..., Any], attributes_to_get: Optional[List[str]]) -> Callable[..., Any]:
+    """
+    Wrap a query/scan function so it reads only attributes_to_get unless the
+    caller asks for its own projection.
+    """
+    if attributes_to_get is None:
+        return inquiry_funct
+
+    @functools.wraps(inquiry_funct)
+    def funct(*args: Any, **kwargs: Any) -> Any:
+        kwargs.setdefault("attributes_to_get", attributes_to_get)
+        return inquiry_funct(*args, **kwargs)
+
+    return funct
+
+
+def _to_plain(value: Any) -> Any:
+    """
+    Convert a MapAttribute/ListAttribute value to plain dicts and lists.
+    """
+    if isinstance(value, MapAttribute):
+        return {key: _to_plain(item) for key, item in value.attribute_values.items()}
+    if isinstance(value, dict):
+        return {key: _to_plain(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return [_to_plain(item) for item in value]
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    return value
+
+
+class ModelSerializer:
+    """
+    Build GraphQL type instances straight from model attribute values.
+    The field table (which type fields are model attributes and which of them
+    need converting) is worked out once per model/type pair, so a row costs a
+    dict copy and a pass over the map attributes instead of a JSON round trip
+    through Serializer.json_normalize.
+    """
+
+    def __init__(self, model_class: Any, type_class: Any) -> None:
+        attributes = model_class.get_attributes()
+        self.type_class = type_class
+        # Type fields that are not attributes (e.g. app_config) stay None.
+        self.defaults = dict.fromkeys(type_class._meta.fields)
+        self.fields = [
+            name for name in type_class._meta.fields if name in attributes
+        ]
+        self.converted_fields = [
+            name
+            for name in self.fields
+            if isinstance(attributes[name], (MapAttribute, ListAttribute))
+        ]
+
+    def to_dict(self, entity: Any) -> Dict[str, Any]:
+        values = entity.attribute_values
+        data = self.defaults.copy()
+        for name in self.fields:
+            if name in values:
+                data[name] = values[name]
+        for name in self.converted_fields:
+            if data[name] is not None:
+                data[name] = _to_plain(data[name])
+        return data
+
+    def to_type(self, entity: Any) -> Any:
+        # Every field is set from the table above, so the generated __init__
+        # (keyword checks and defaults) can be skipped.
+        instance = self.type_class.__new__(self.type_class)
+        instance.__dict__.update(self.to_dict(entity))
+        return instance
+
+
+def insert_update_decorator(
+    get_funct: Callable[..., Any], model_funct: Callable[..., Any], **kwargs: Any
+) -> Callable:
+    """
+    silvaengine's insert_update_decorator with its existence check and its
+    entity read served by one GetItem: get_funct returns the item or None, and
+    the item it found is handed to the entity read of the same call. The read
+    after the write still goes to model_funct.
+    Args:
+        get_funct: Returns the item for the keys, or None.
+        model_funct: Reads the item for the keys; raises if it is missing.
+        **kwargs: The other insert_update_decorator arguments.
+    """
+
+    def actual_decorator(original_function: Callable) -> Callable:
+        @functools.wraps(original_function)
+        def wrapper_function(*args: Any, **params: Any) -> Any:
+            # Scoped to this call, so nothing else can consume or replace it.
+            fetched = {}
+
+            def count_funct(*keys: Any) -> int:
+                fetched[keys] = get_funct(*keys)
+                return 0 if fetched[keys] is None else 1
+
+            def entity_funct(*keys: Any) -> Any:
+                entity = fetched.pop(keys, None)
+                return entity if entity is not None else model_funct(*keys)
+
+            return base_insert_update_decorator(
+                model_funct=entity_funct, count_funct=count_funct, **kwargs
+            )(original_function)(*args, **params)
+
+        return wrapper_function
+
+    return actual_decorator
+
+
+@instrument
+def _exists_any(
+    inquiry_funct: Callable[..., Any],
+    hash_key: Any,
+    range_key_condition: Any = None,
+    filter_condition: Any = None,
+    attributes_to_get: Optional[List[str]] = None,
+) -> bool:
+    """
+    Return True as soon as one item matches the query, reading only the
+    projected attributes. DynamoDB applies Limit before the filter, so filtered
+    queries read larger pages instead of one item per round trip.
+    """
+    results = inquiry_funct(
+        hash_key,
+        range_key_condition,
+        filter_condition,
+        limit=1,
+        page_size=1 if filter_condition is None else EXISTS_FILTERED_PAGE_SIZE,
+        attributes_to_get=attributes_to_get,
+    )
+    return next(iter(results), None) is not None
+
+
+def _app_config_to_dict(app_config: Any) -> Dict[str, Any]:
+    return Serializer.json_normalize(
+        {
+            "platform": app_config.platform,
+            "app_id": app_config.app_id,
+            "configruation": app_config.configuration
+        }
+    )
+
+
+class AppConfigLoader:
+    """
+    Per-request, DataLoader-style loader for app configs.
+    Keys are primed while the rows of a page are built and fetched together
+    with one BatchGetItem on the first load, so a page costs one read instead
+    of one GetItem per row.
+    """
+
+    def __init__(self) -> None:
+        self.pending = set()
+        self.results = {}
+        self._lock = threading.Lock()
+
+    def prime(self, platform: str, app_id: str) -> None:
+        key = (platform, app_id)
+        with self._lock:
+            if key not in self.results:
+                self.pending.add(key)
+
+    def load(self, platform: str, app_id: str) -> Optional[Dict[str, Any]]:
+        key = (platform, app_id)
+        self.prime(platform, app_id)
+        with self._lock:
+            if key not in self.results:
+                self._dispatch()
+            return self.results.get(key)
+
+    @instrument
+    def _dispatch(self) -> None:
+        from .app_config import AppConfigModel
+
+        def batch_get(keys: List[Tuple[str, str]]) -> Dict[Tuple[str, str], Any]:
+            return {
+                (app_config.platform, app_config.app_id): _app_config_to_dict(app_config)
+                for app_config in AppConfigModel.batch_get(keys)
+            }
+
+        keys, self.pending = self.pending, set()
+        # Missing configs load as None and are remembered too, so they are not
+        # requested again. A config written while the batch is in flight is
+        # not cached (see TTLCache.get_or_load_many).
+        self.results.update(app_config_cache.get_or_load_many(keys, batch_get))
+
+
+def _get_app_config_loader(info: Any) -> AppConfigLoader:
+    loader = info.context.get("app_config_loader")
+    if loader is None:
+        loader = info.context.setdefault("app_config_loader", AppConfigLoader())
+    return loader
+
+
+@dynamodb_retry
+def _batch_write_page(model_class: Any, put_items: List[Dict[str, Any]]) -> Dict[str, Any]:
+    return model_class._get_connection().batch_write_item(put_items=put_items)
+
+
+@instrument
+def _batch_write(
+    model_class: Any, entities: List[Any], pacer: Any = None
+) -> List[Optional[str]]:
+    """
+    Put entities with BatchWriteItem, BATCH_WRITE_LIMIT per call.
+    Unprocessed items are resent with the RetryPolicy backoff. A key already
+    put in the same call is reported as an error instead of overwriting it.
+    Args:
+        model_class: The pynamodb model class of the entities.
+        entities (List): Model instances to put.
+        pacer: Optional shared rate controller; pacer.wait() is called before
+            every BatchWriteItem and pacer.record(throttled) after it.
+    Returns:
+        One entry per entity: None when written, otherwise the error message.
+    """
+    key_names = [model_class._hash_key_attribute().attr_name]
+    if model_class._range_key_attribute() is not None:
+        key_names.append(model_class._range_key_attribute().attr_name)
 
+    def _key(item: Dict[str, Any]) -> str:
+        return json.dumps([item[name] for name in key_names], sort_keys=True)
 
+    table_name = model_class.Meta.table_name
+    errors = [None] * len(entities)
+    for start in range(0, len(entities), BATCH_WRITE_LIMIT):
+        pending = {}
+        for position in range(start, min(start + BATCH_WRITE_LIMIT, len(entities))):
+            item = entities[position].serialize()
+            key = _key(item)
+            # BatchWriteItem can't put one key twice; keep the first row.
+            if key in pending:
+                errors[position] = "Duplicate key in the same batch."
+                continue
+            pending[key] = (position, item)
 
-def _get_app_config(platform: str, app_id: str) -> Dict[str, Any]:
-    from .app_config import get_app_config
+        attempt = 0
+        while pending:
+            attempt += 1
+            if pacer is not None:
+                pacer.wait()
+            try:
+                data = _batch_write_page(
+                    model_class, [item for _, item in pending.values()]
+                )
+            except Exception as e:
+                if pacer is not None:
+                    pacer.record(throttled=is_transient_error(e))
+                for position, _ in pending.values():
+                    errors[position] = str(e)
+                break
 
-    app_config = get_app_config(platform, app_id)
+            unprocessed = (data or {}).get("UnprocessedItems", {}).get(table_name, [])
+            if pacer is not None:
+                pacer.record(throttled=bool(unprocessed))
+            unprocessed_keys = {
+                _key(request["PutRequest"]["Item"]) for request in unprocessed
+            }
+            pending = {
+                key: value for key, value in pending.items() if key in unprocessed_keys
+            }
+            if not pending:
+                break
+            if attempt >= RetryPolicy.max_attempts:
+                for position, _ in pending.values():
+                    errors[position] = "Unprocessed after retries (throttled)."
+                break
+            time.sleep(RetryPolicy.delay(attempt))
 
-    return {
-        "platform": app_config.platform,
-        "app_id": app_config.app_id,
-        "configruation": app_config.configuration
-    }
\ No newline at end of file
+    return errors
@@ -6,8 +6,8 @@ from typing import Any, Dict
 from graphene import Boolean, Field, List, Mutation, String
 
 from silvaengine_utility import JSONCamelCase
-from ..models.thread import delete_thread, insert_thread
-from ..types.thread import ThreadType
+from ..models.thread import delete_thread, insert_thread, insert_threads
+from ..types.thread import InsertThreadResultType, ThreadInputType, ThreadType
 
 
 class InsertThread(Mutation):
@@ -31,6 +31,24 @@ class InsertThread(Mutation):
         return InsertThread(thread=thread)
 
 
+class InsertThreads(Mutation):
+    results = List(InsertThreadResultType)
+
+    class Arguments:
+        threads = List(ThreadInputType, required=True)
+
+    @staticmethod
+    def mutate(root: Any, info: Any, **kwargs: Dict[str, Any]) -> "InsertThreads":
+        try:
+            results = insert_threads(info, **kwargs)
+        except Exception as e:
+            log = traceback.format_exc()
+            info.context.get("logger").error(log)
+            raise e
+
+        return InsertThreads(results=results)
+
+
 class DeleteThread(Mutation):
     ok = Boolean()
 
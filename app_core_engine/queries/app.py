@@ -9,7 +9,7 @@ from typing import Any, Dict
 from graphene import ResolveInfo
 
 from ..models import app
-from ..types.app import AppListType, AppType
+from ..types.app import AppListType, AppType, InstalledAppTokenType
 
 
 def resolve_app(info: ResolveInfo, **kwargs: Dict[str, Any]) -> AppType:
@@ -18,3 +18,9 @@ def resolve_app(info: ResolveInfo, **kwargs: Dict[str, Any]) -> AppType:
 
 def resolve_app_list(info: ResolveInfo, **kwargs: Dict[str, Any]) -> AppListType:
     return app.resolve_app_list(info, **kwargs)
+
+
+def resolve_installed_app_token(
+    info: ResolveInfo, **kwargs: Dict[str, Any]
+) -> InstalledAppTokenType:
+    return app.resolve_installed_app_token(info, **kwargs)
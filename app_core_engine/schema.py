@@ -20,13 +20,13 @@ from graphene import (
 
 from .mutations.app_config import DeleteAppConfig, InsertUpdateAppConfig
 from .mutations.app import DeleteApp, InsertUpdateApp
-from .mutations.thread import DeleteThread, InsertThread
-from .queries.app import resolve_app, resolve_app_list
+from .mutations.thread import DeleteThread, InsertThread, InsertThreads
+from .queries.app import resolve_app, resolve_app_list, resolve_installed_app_token
 from .queries.app_config import resolve_app_config, resolve_app_config_list
 from .queries.thread import resolve_thread, resolve_thread_list
-from .types.app import AppListType, AppType
+from .types.app import AppListType, AppType, InstalledAppTokenType
 from .types.app_config import AppConfigListType, AppConfigType
-from .types.thread import ThreadListType, ThreadType
+from .types.thread import InsertThreadResultType, ThreadListType, ThreadType
 
 
 def type_class():
@@ -35,8 +35,10 @@ def type_class():
         AppConfigType,
         AppListType,
         AppType,
+        InstalledAppTokenType,
         ThreadType,
         ThreadListType,
+        InsertThreadResultType,
     ]
 
 
@@ -53,6 +55,10 @@ class Query(ObjectType):
         AppConfigListType,
         page_number=Int(required=False),
         limit=Int(required=False),
+        after=String(required=False),
+        first=Int(required=False),
+        with_total=Boolean(required=False),
+        allow_scan=Boolean(required=False),
         platform=String(required=False),
         app_id=String(required=False),
     )
@@ -63,10 +69,20 @@ class Query(ObjectType):
         target_id=String(required=True),
     )
 
+    installed_app_token = Field(
+        InstalledAppTokenType,
+        app_id=String(required=True),
+        target_id=String(required=True),
+    )
+
     app_list = Field(
         AppListType,
         page_number=Int(required=False),
         limit=Int(required=False),
+        after=String(required=False),
+        first=Int(required=False),
+        with_total=Boolean(required=False),
+        allow_scan=Boolean(required=False),
         app_id=String(required=False),
         target_id=String(required=False),
         platform=String(required=False),
@@ -83,6 +99,10 @@ class Query(ObjectType):
         ThreadListType,
         page_number=Int(required=False),
         limit=Int(required=False),
+        after=String(required=False),
+        first=Int(required=False),
+        with_total=Boolean(required=False),
+        allow_scan=Boolean(required=False),
         platform=String(required=True),
         app_id=String(required=False),
         user_id=String(required=False),
@@ -95,6 +115,11 @@ class Query(ObjectType):
     def resolve_app(self, info: ResolveInfo, **kwargs: Dict[str, Any]) -> AppType:
         return resolve_app(info, **kwargs)
 
+    def resolve_installed_app_token(
+        self, info: ResolveInfo, **kwargs: Dict[str, Any]
+    ) -> InstalledAppTokenType:
+        return resolve_installed_app_token(info, **kwargs)
+
     def resolve_app_list(
         self, info: ResolveInfo, **kwargs: Dict[str, Any]
     ) -> AppListType:
@@ -123,4 +148,5 @@ class Mutations(ObjectType):
     insert_update_app_config = InsertUpdateAppConfig.Field()
     delete_app_config = DeleteAppConfig.Field()
     insert_thread = InsertThread.Field()
+    insert_threads = InsertThreads.Field()
     delete_thread = DeleteThread.Field()
@@ -4,10 +4,14 @@ from __future__ import print_function
 
 __author__ = "bibow"
 
-from graphene import DateTime, Int, List, ObjectType, String
-from silvaengine_dynamodb_base import ListObjectType
+import traceback
+from typing import Any, Dict
+
+from graphene import DateTime, Int, List, ObjectType, ResolveInfo, String
 from silvaengine_utility import JSONCamelCase
 
+from .pagination import CursorListObjectType
+
 
 class AppType(ObjectType):
     app_id = String()
@@ -22,6 +26,27 @@ class AppType(ObjectType):
     updated_at = DateTime()
     app_config = JSONCamelCase()
 
+    def resolve_app_config(parent, info: ResolveInfo) -> Dict[str, Any]:
+        if parent.app_config is not None:
+            return parent.app_config
+
+        from ..models.utils import _get_app_config_loader
+
+        try:
+            return _get_app_config_loader(info).load(parent.platform, parent.app_id)
+        except Exception as e:
+            log = traceback.format_exc()
+            info.context.get("logger").exception(log)
+            raise e
+
+
+class InstalledAppTokenType(ObjectType):
+    app_id = String()
+    target_id = String()
+    platform = String()
+    access_token = String()
+    scope = String()
+
 
-class AppListType(ListObjectType):
+class AppListType(CursorListObjectType):
     app_list = List(AppType)
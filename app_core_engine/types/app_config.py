@@ -5,9 +5,10 @@ from __future__ import print_function
 __author__ = "bibow"
 
 from graphene import DateTime, Int, List, ObjectType, String
-from silvaengine_dynamodb_base import ListObjectType
 from silvaengine_utility import JSONCamelCase
 
+from .pagination import CursorListObjectType
+
 
 class AppConfigType(ObjectType):
     platform = String()
@@ -17,5 +18,5 @@ class AppConfigType(ObjectType):
     updated_at = DateTime()
 
 
-class AppConfigListType(ListObjectType):
+class AppConfigListType(CursorListObjectType):
     app_config_list = List(AppConfigType)
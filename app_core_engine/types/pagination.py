@@ -0,0 +1,13 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+from __future__ import print_function
+
+__author__ = "bibow"
+
+from graphene import Boolean, String
+from silvaengine_dynamodb_base import ListObjectType
+
+
+class CursorListObjectType(ListObjectType):
+    end_cursor = String()
+    has_next_page = Boolean()
@@ -4,11 +4,12 @@ from __future__ import print_function
 
 __author__ = "bibow"
 
-from graphene import DateTime, List, ObjectType, String
+from graphene import Boolean, DateTime, Field, InputObjectType, List, ObjectType, String
 
-from silvaengine_dynamodb_base import ListObjectType
 from silvaengine_utility import JSONCamelCase
 
+from .pagination import CursorListObjectType
+
 class ThreadType(ObjectType):
     platform = String()
     thread_uuid = String()
@@ -17,5 +18,20 @@ class ThreadType(ObjectType):
     created_at = DateTime()
 
 
-class ThreadListType(ListObjectType):
+class ThreadListType(CursorListObjectType):
     thread_list = List(ThreadType)
+
+
+class ThreadInputType(InputObjectType):
+    platform = String(required=True)
+    thread_uuid = String(required=True)
+    app_id = String(required=True)
+    user_id = String(required=True)
+
+
+class InsertThreadResultType(ObjectType):
+    platform = String()
+    thread_uuid = String()
+    ok = Boolean()
+    error = String()
+    thread = Field(ThreadType)
@@ -0,0 +1,533 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+End-to-end benchmark of AppCoreEngine.app_core_engine_graphql against a local
+DynamoDB stand-in.
+
+Seeds ace-apps, ace-app-configs and ace-threads, drives a weighted mix of
+queries and mutations through the engine and reports throughput, p50/p95/p99
+latency and DynamoDB calls per operation (collected through the
+instrumentation layer). Results can be saved as a baseline and later runs
+compared against it.
+
+The stand-in is moto's in-process mock by default (needs `moto`); pass
+--endpoint-url to run against DynamoDB Local instead.
+
+    python benchmarks/bench_dynamodb.py --apps 1000 --threads 10000 --mix read
+    python benchmarks/bench_dynamodb.py --endpoint-url http://localhost:8000 \\
+        --apps 100000 --threads 1000000 --seed-only
+    python benchmarks/bench_dynamodb.py --save-baseline benchmarks/baseline.json
+    python benchmarks/bench_dynamodb.py --baseline benchmarks/baseline.json \\
+        --max-regression 20   # fail if any operation's p95 grows by more than 20%
+"""
+from __future__ import print_function
+
+__author__ = "bibow"
+
+import argparse
+import json
+import logging
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+PLATFORMS = ["shopify", "bigcommerce", "woocommerce", "magento"]
+STATUSES = ["installed", "installed", "installed", "uninstalled"]
+SEED_CHUNK = 1000
+
+OPERATIONS = {
+    "app": """
+        query app($appId: String!, $targetId: String!) {
+            app(appId: $appId, targetId: $targetId) {
+                appId targetId platform status accessToken appConfig updatedAt
+            }
+        }
+    """,
+    "appListByTarget": """
+        query appList($targetId: String, $statuses: [String]) {
+            appList(targetId: $targetId, statuses: $statuses, first: 20) {
+                endCursor hasNextPage
+                appList { appId targetId platform status appConfig }
+            }
+        }
+    """,
+    "appConfig": """
+        query appConfig($platform: String!, $appId: String!) {
+            appConfig(platform: $platform, appId: $appId) {
+                platform appId configuration
+            }
+        }
+    """,
+    "thread": """
+        query thread($platform: String!, $threadUuid: String!) {
+            thread(platform: $platform, threadUuid: $threadUuid) {
+                platform threadUuid appId userId createdAt
+            }
+        }
+    """,
+    "threadListByUser": """
+        query threadList($platform: String!, $userId: String) {
+            threadList(platform: $platform, userId: $userId, first: 50) {
+                endCursor hasNextPage
+                threadList { threadUuid appId userId createdAt }
+            }
+        }
+    """,
+    "threadListByApp": """
+        query threadList($platform: String!, $appId: String) {
+            threadList(platform: $platform, appId: $appId, first: 50) {
+                endCursor hasNextPage
+                threadList { threadUuid appId userId createdAt }
+            }
+        }
+    """,
+    "dashboard": """
+        query dashboard(
+            $appId: String!, $targetId: String!, $platform: String!, $userId: String
+        ) {
+            app(appId: $appId, targetId: $targetId) { appId status appConfig }
+            appConfig(platform: $platform, appId: $appId) { configuration }
+            threadList(platform: $platform, userId: $userId, first: 20) {
+                threadList { threadUuid createdAt }
+            }
+        }
+    """,
+    "insertThread": """
+        mutation insertThread(
+            $platform: String!, $threadUuid: String!, $appId: String!, $userId: String!
+        ) {
+            insertThread(
+                platform: $platform, threadUuid: $threadUuid, appId: $appId, userId: $userId
+            ) {
+                thread { platform threadUuid }
+            }
+        }
+    """,
+    "insertUpdateApp": """
+        mutation insertUpdateApp(
+            $appId: String!, $targetId: String!, $platform: String!,
+            $accessToken: String!, $userId: String, $scope: String, $data: JSONCamelCase!
+        ) {
+            insertUpdateApp(
+                appId: $appId, targetId: $targetId, platform: $platform,
+                accessToken: $accessToken, userId: $userId, scope: $scope, data: $data
+            ) {
+                app { appId targetId status }
+            }
+        }
+    """,
+}
+
+# Relative weights of each operation in a mix.
+MIXES = {
+    "read": {
+        "app": 30,
+        "appListByTarget": 15,
+        "appConfig": 10,
+        "thread": 20,
+        "threadListByUser": 15,
+        "threadListByApp": 10,
+        "dashboard": 10,
+    },
+    "write": {"insertThread": 70, "insertUpdateApp": 30},
+    "mixed": {
+        "app": 25,
+        "appListByTarget": 10,
+        "appConfig": 5,
+        "thread": 15,
+        "threadListByUser": 15,
+        "threadListByApp": 5,
+        "insertThread": 20,
+        "insertUpdateApp": 5,
+    },
+}
+
+
+class Population:
+    """
+    Deterministic key space shared by the seeder and the workload, so every
+    generated read targets a row that was seeded.
+    """
+
+    def __init__(self, apps, app_configs, threads, users, seed):
+        self.apps = apps
+        self.app_configs = max(app_configs, 1)
+        self.threads = threads
+        self.users = max(users, 1)
+        self.random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def app_key(self, n):
+        # Each app shares its platform with its app config row.
+        platform, app_id = self.app_config_key(n % self.app_configs)
+        return app_id, f"store-{n:08d}", platform
+
+    def app_config_key(self, n):
+        return PLATFORMS[n % len(PLATFORMS)], f"app-{n:06d}"
+
+    def thread_key(self, n):
+        platform = PLATFORMS[n % len(PLATFORMS)]
+        return (
+            platform,
+            str(uuid.UUID(int=n + 1)),
+            self.app_key(n % max(self.apps, 1))[0],
+            f"user-{n % self.users:06d}",
+        )
+
+    def pick(self, size):
+        with self._lock:
+            return self.random.randrange(max(size, 1))
+
+
+def _seed(population, logger):
+    from app_core_engine.models.app import AppModel
+    from app_core_engine.models.app_config import AppConfigModel
+    from app_core_engine.models.thread import ThreadModel
+    from app_core_engine.models.utils import _batch_write
+
+    now = datetime.now(timezone.utc)
+
+    def write(model_class, size, build):
+        start, failed = time.perf_counter(), 0
+        for offset in range(0, size, SEED_CHUNK):
+            entities = [build(n) for n in range(offset, min(offset + SEED_CHUNK, size))]
+            failed += sum(1 for error in _batch_write(model_class, entities) if error)
+        logger.info(
+            f"seeded {size - failed}/{size} {model_class.Meta.table_name} "
+            f"in {time.perf_counter() - start:.1f}s"
+        )
+
+    def build_app_config(n):
+        platform, app_id = population.app_config_key(n)
+        return AppConfigModel(
+            platform,
+            app_id,
+            configuration={"apiVersion": "2024-01", "webhooks": [f"hook-{n}"]},
+            created_at=now,
+            updated_at=now,
+        )
+
+    def build_app(n):
+        app_id, target_id, platform = population.app_key(n)
+        return AppModel(
+            app_id,
+            target_id,
+            platform=platform,
+            access_token=f"token-{n}",
+            scope="read,write",
+            user_id=f"user-{n % population.users:06d}",
+            data={"plan": "basic", "locale": "en"},
+            status=STATUSES[n % len(STATUSES)],
+            created_at=now,
+            updated_at=now,
+        )
+
+    def build_thread(n):
+        platform, thread_uuid, app_id, user_id = population.thread_key(n)
+        return ThreadModel(
+            platform,
+            thread_uuid,
+            app_id=app_id,
+            user_id=user_id,
+            created_at=now - timedelta(seconds=n),
+        )
+
+    write(AppConfigModel, population.app_configs, build_app_config)
+    write(AppModel, population.apps, build_app)
+    write(ThreadModel, population.threads, build_thread)
+
+
+def _variables(name, population):
+    if name == "app":
+        app_id, target_id, _ = population.app_key(population.pick(population.apps))
+        return {"appId": app_id, "targetId": target_id}
+    if name == "appListByTarget":
+        _, target_id, _ = population.app_key(population.pick(population.apps))
+        return {"targetId": target_id, "statuses": ["installed"]}
+    if name == "appConfig":
+        platform, app_id = population.app_config_key(population.pick(population.app_configs))
+        return {"platform": platform, "appId": app_id}
+    if name == "thread":
+        platform, thread_uuid, _, _ = population.thread_key(population.pick(population.threads))
+        return {"platform": platform, "threadUuid": thread_uuid}
+    if name == "threadListByUser":
+        platform, _, _, user_id = population.thread_key(population.pick(population.threads))
+        return {"platform": platform, "userId": user_id}
+    if name == "threadListByApp":
+        platform, _, app_id, _ = population.thread_key(population.pick(population.threads))
+        return {"platform": platform, "appId": app_id}
+    if name == "dashboard":
+        app_id, target_id, platform = population.app_key(population.pick(population.apps))
+        _, _, _, user_id = population.thread_key(population.pick(population.threads))
+        return {"appId": app_id, "targetId": target_id, "platform": platform, "userId": user_id}
+    if name == "insertThread":
+        platform, _, app_id, user_id = population.thread_key(population.pick(population.threads))
+        return {
+            "platform": platform,
+            "threadUuid": str(uuid.uuid4()),
+            "appId": app_id,
+            "userId": user_id,
+        }
+    if name == "insertUpdateApp":
+        app_id, target_id, platform = population.app_key(population.pick(population.apps))
+        return {
+            "appId": app_id,
+            "targetId": target_id,
+            "platform": platform,
+            "accessToken": f"token-{uuid.uuid4().hex[:8]}",
+            "userId": "user-000000",
+            "scope": "read,write",
+            "data": {"plan": "pro"},
+        }
+    raise ValueError(f"Unknown operation: {name}")
+
+
+def _percentile(samples, percent):
+    if not samples:
+        return 0.0
+    index = min(len(samples) - 1, max(0, int(round(len(samples) * percent / 100.0)) - 1))
+    return samples[index]
+
+
+def _run(engine, population, mix, requests, concurrency):
+    from app_core_engine.handlers.instrumentation import Instrumentation
+
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    chooser = random.Random(1)
+    plan = chooser.choices(names, weights=weights, k=requests)
+
+    results = {name: {"samples": [], "calls": [], "operations": {}, "errors": 0} for name in names}
+    lock = threading.Lock()
+    local = threading.local()
+
+    def sink(record):
+        local.record = record
+
+    Instrumentation.add_sink(sink)
+
+    def call(name):
+        local.record = None
+        variables = _variables(name, population)
+        start = time.perf_counter()
+        response = engine.app_core_engine_graphql(
+            query=OPERATIONS[name], variables=variables, operation_name=None
+        )
+        elapsed = (time.perf_counter() - start) * 1000
+        if isinstance(response, str):
+            response = json.loads(response)
+        record = local.record or {"dynamodb": {"calls": 0, "operations": {}}}
+
+        with lock:
+            result = results[name]
+            result["samples"].append(elapsed)
+            result["calls"].append(record["dynamodb"]["calls"])
+            for operation, count in record["dynamodb"].get("operations", {}).items():
+                result["operations"][operation] = result["operations"].get(operation, 0) + count
+            if not isinstance(response, dict) or response.get("errors"):
+                result["errors"] += 1
+
+    try:
+        start = time.perf_counter()
+        if concurrency > 1:
+            with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                list(executor.map(call, plan))
+        else:
+            for name in plan:
+                call(name)
+        wall = time.perf_counter() - start
+    finally:
+        Instrumentation.sinks.remove(sink)
+
+    summary = {"requests": requests, "wall_s": round(wall, 3), "throughput_rps": round(requests / wall, 1), "operations": {}}
+    for name, result in results.items():
+        samples = sorted(result["samples"])
+        if not samples:
+            continue
+        summary["operations"][name] = {
+            "count": len(samples),
+            "errors": result["errors"],
+            "mean_ms": round(statistics.mean(samples), 3),
+            "p50_ms": round(_percentile(samples, 50), 3),
+            "p95_ms": round(_percentile(samples, 95), 3),
+            "p99_ms": round(_percentile(samples, 99), 3),
+            "dynamodb_calls_per_request": round(statistics.mean(result["calls"]), 2),
+            "dynamodb_operations": {
+                operation: round(count / len(samples), 2)
+                for operation, count in sorted(result["operations"].items())
+            },
+        }
+    return summary
+
+
+def _print(summary):
+    print(
+        f"requests: {summary['requests']}  wall: {summary['wall_s']}s  "
+        f"throughput: {summary['throughput_rps']} req/s"
+    )
+    print(
+        f"{'operation':<20}{'count':>7}{'err':>5}{'p50 ms':>10}{'p95 ms':>10}"
+        f"{'p99 ms':>10}{'ddb/req':>9}  operations/req"
+    )
+    for name, stats in summary["operations"].items():
+        operations = ", ".join(f"{op}={count}" for op, count in stats["dynamodb_operations"].items())
+        print(
+            f"{name:<20}{stats['count']:>7}{stats['errors']:>5}{stats['p50_ms']:>10.2f}"
+            f"{stats['p95_ms']:>10.2f}{stats['p99_ms']:>10.2f}"
+            f"{stats['dynamodb_calls_per_request']:>9.2f}  {operations}"
+        )
+
+
+def _compare(summary, baseline, max_regression):
+    """
+    Print the change against the baseline; return the operations whose p95
+    grew by more than max_regression percent or that now make more DynamoDB
+    calls per request.
+    """
+    regressions = []
+    print(f"\nagainst baseline ({baseline.get('config', {})}):")
+    for name, stats in summary["operations"].items():
+        before = baseline.get("operations", {}).get(name)
+        if before is None:
+            continue
+        change = (stats["p95_ms"] - before["p95_ms"]) / max(before["p95_ms"], 1e-9) * 100
+        calls_before = before["dynamodb_calls_per_request"]
+        print(
+            f"{name:<20} p95 {before['p95_ms']:>8.2f} -> {stats['p95_ms']:>8.2f}ms "
+            f"({change:+.1f}%)  ddb/req {calls_before:.2f} -> "
+            f"{stats['dynamodb_calls_per_request']:.2f}"
+        )
+        if max_regression is not None and change > max_regression:
+            regressions.append(name)
+        elif stats["dynamodb_calls_per_request"] > calls_before + 0.01:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--apps", type=int, default=1000)
+    parser.add_argument("--app-configs", type=int, default=100)
+    parser.add_argument("--threads", type=int, default=10000)
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--mix", choices=sorted(MIXES), default="mixed")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--warmup", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument(
+        "--async-execution",
+        action="store_true",
+        help="Run root query fields concurrently (graphql_async_enabled).",
+    )
+    parser.add_argument(
+        "--endpoint-url",
+        default=None,
+        help="DynamoDB Local endpoint; the moto in-process mock is used when omitted.",
+    )
+    parser.add_argument("--skip-seed", action="store_true", help="Reuse already seeded tables.")
+    parser.add_argument("--seed-only", action="store_true")
+    parser.add_argument("--save-baseline", default=None, help="Write the results to this file.")
+    parser.add_argument("--baseline", default=None, help="Compare against this results file.")
+    parser.add_argument(
+        "--max-regression",
+        type=float,
+        default=None,
+        help="Exit non-zero if any operation's p95 grows by more than this percent.",
+    )
+    parser.add_argument("--json", action="store_true", help="Print the results as JSON.")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    logger = logging.getLogger("bench_dynamodb")
+    logger.setLevel(logging.INFO)
+
+    for name, value in [
+        ("AWS_DEFAULT_REGION", "us-east-1"),
+        ("AWS_ACCESS_KEY_ID", "bench"),
+        ("AWS_SECRET_ACCESS_KEY", "bench"),
+    ]:
+        os.environ.setdefault(name, value)
+
+    mock = None
+    if args.endpoint_url is None:
+        from moto import mock_aws
+
+        mock = mock_aws()
+        mock.start()
+
+    try:
+        from silvaengine_dynamodb_base import BaseModel
+
+        from app_core_engine.main import AppCoreEngine
+
+        if args.endpoint_url is not None:
+            BaseModel.Meta.host = args.endpoint_url
+
+        engine_logger = logging.getLogger("app_core_engine")
+        engine_logger.setLevel(logging.WARNING)
+        engine = AppCoreEngine(
+            engine_logger,
+            test_mode="local_for_all",
+            instrumentation_enabled=True,
+            instrumentation_log_records=False,
+            graphql_async_enabled=args.async_execution,
+            # Keep cached reads from hiding DynamoDB cost between iterations.
+            app_config_cache_max_size=0,
+        )
+
+        population = Population(
+            args.apps, args.app_configs, args.threads, args.users, args.seed
+        )
+        if not args.skip_seed:
+            _seed(population, logger)
+        if args.seed_only:
+            return 0
+
+        mix = MIXES[args.mix]
+        if args.warmup:
+            _run(engine, population, mix, args.warmup, 1)
+        summary = _run(engine, population, mix, args.requests, args.concurrency)
+        summary["config"] = {
+            "backend": "dynamodb-local" if args.endpoint_url else "moto",
+            "apps": args.apps,
+            "app_configs": args.app_configs,
+            "threads": args.threads,
+            "users": args.users,
+            "mix": args.mix,
+            "concurrency": args.concurrency,
+            "async_execution": args.async_execution,
+        }
+
+        if args.json:
+            print(json.dumps(summary, indent=2))
+        else:
+            _print(summary)
+
+        if args.save_baseline:
+            with open(args.save_baseline, "w") as baseline_file:
+                json.dump(summary, baseline_file, indent=2, sort_keys=True)
+            print(f"baseline written to {args.save_baseline}")
+
+        if args.baseline:
+            with open(args.baseline) as baseline_file:
+                regressions = _compare(summary, json.load(baseline_file), args.max_regression)
+            if regressions:
+                print(f"REGRESSION: {', '.join(regressions)}")
+                return 1
+        return 0
+    finally:
+        if mock is not None:
+            mock.stop()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
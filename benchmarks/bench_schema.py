@@ -0,0 +1,119 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+Micro-benchmark for the per-request GraphQL overhead of AppCoreEngine.
+
+Compares building the graphene Schema on every request (the old behaviour)
+with the process-level CachedSchema, with and without the document cache.
+Only the `ping` field is executed, so no DynamoDB access is needed.
+
+    python benchmarks/bench_schema.py --iterations 500
+    python benchmarks/bench_schema.py --max-overhead-us 300   # fail on regression
+"""
+from __future__ import print_function
+
+__author__ = "bibow"
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app_core_engine.handlers.executor import CachedSchema  # noqa: E402
+from app_core_engine.main import AppCoreEngine  # noqa: E402
+
+QUERY = """
+query appList($appId: String, $limit: Int) {
+    ping
+    appList(appId: $appId, limit: $limit) {
+        pageSize
+        pageNumber
+        total
+        appList {
+            appId
+            targetId
+            platform
+            status
+            appConfig
+            createdAt
+            updatedAt
+        }
+    }
+}
+"""
+PING = "query ping { ping }"
+
+
+def _measure(funct, iterations):
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        funct()
+        samples.append((time.perf_counter() - start) * 1_000_000)
+    return samples
+
+
+def _report(label, samples):
+    samples = sorted(samples)
+    p95 = samples[int(len(samples) * 0.95) - 1]
+    print(
+        f"{label:<28} mean {statistics.mean(samples):>10.1f}us  "
+        f"p50 {statistics.median(samples):>10.1f}us  p95 {p95:>10.1f}us"
+    )
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument(
+        "--max-overhead-us",
+        type=float,
+        default=None,
+        help="Exit non-zero if the cached p50 overhead exceeds this value.",
+    )
+    args = parser.parse_args()
+
+    def per_request_build():
+        schema = AppCoreEngine.build_graphql_schema()
+        schema.execute(PING)
+        # Parse and validate the list document like a real request would.
+        CachedSchema(schema, document_cache_size=0).get_document(QUERY)
+
+    singleton = CachedSchema(AppCoreEngine.build_graphql_schema(), document_cache_size=0)
+
+    def singleton_no_document_cache():
+        singleton.execute(PING)
+        singleton.get_document(QUERY)
+
+    cached = CachedSchema(AppCoreEngine.build_graphql_schema(), document_cache_size=128)
+
+    def singleton_document_cache():
+        cached.execute(PING)
+        cached.get_document(QUERY)
+
+    print(f"iterations: {args.iterations}")
+    before = _report("build per request", _measure(per_request_build, args.iterations))
+    _report(
+        "singleton schema",
+        _measure(singleton_no_document_cache, args.iterations),
+    )
+    after = _report(
+        "singleton + document cache",
+        _measure(singleton_document_cache, args.iterations),
+    )
+    print(f"speedup (p50): {before / after:.1f}x")
+
+    if args.max_overhead_us is not None and after > args.max_overhead_us:
+        print(
+            f"REGRESSION: cached overhead {after:.1f}us > {args.max_overhead_us:.1f}us"
+        )
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,116 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+Micro-benchmark for the model-to-GraphQL row conversion.
+
+Compares the generic path (attribute_values -> Serializer.json_normalize ->
+Type(**...)) with the per-model ModelSerializer for pages of deserialized
+AppModel, AppConfigModel and ThreadModel rows. No DynamoDB access is needed.
+
+    python benchmarks/bench_serializer.py --rows 1000 --pages 20
+"""
+from __future__ import print_function
+
+__author__ = "bibow"
+
+import argparse
+import os
+import statistics
+import sys
+import time
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from silvaengine_utility import Serializer  # noqa: E402
+
+from app_core_engine.models.app import AppModel, app_serializer  # noqa: E402
+from app_core_engine.models.app_config import (  # noqa: E402
+    AppConfigModel,
+    app_config_serializer,
+)
+from app_core_engine.models.thread import ThreadModel, thread_serializer  # noqa: E402
+from app_core_engine.types.app import AppType  # noqa: E402
+from app_core_engine.types.app_config import AppConfigType  # noqa: E402
+from app_core_engine.types.thread import ThreadType  # noqa: E402
+
+
+def _rows(rows):
+    now = datetime.now(timezone.utc)
+    apps, app_configs, threads = [], [], []
+    for n in range(rows):
+        app = AppModel(
+            f"app-{n % 50}",
+            f"store-{n}",
+            platform="shopify",
+            access_token=f"token-{n}",
+            scope="read_products,write_orders",
+            user_id=f"user-{n % 100}",
+            data={
+                "plan": "basic",
+                "shop": {"currency": "USD", "locales": ["en", "fr"], "limits": {"api": 40}},
+            },
+            status="installed",
+            created_at=now,
+            updated_at=now,
+        )
+        app_config = AppConfigModel(
+            "shopify",
+            f"app-{n}",
+            configuration={"apiVersion": "2024-01", "webhooks": [{"topic": "orders/create"}]},
+            created_at=now,
+            updated_at=now,
+        )
+        thread = ThreadModel(
+            "shopify", f"thread-{n}", app_id=f"app-{n % 50}", user_id="u", created_at=now
+        )
+        # Round trip through the DynamoDB format so maps are deserialized the
+        # way a query returns them.
+        apps.append(AppModel.from_raw_data(app.serialize()))
+        app_configs.append(AppConfigModel.from_raw_data(app_config.serialize()))
+        threads.append(ThreadModel.from_raw_data(thread.serialize()))
+    return apps, app_configs, threads
+
+
+def _measure(funct, entities, pages):
+    samples = []
+    for _ in range(pages):
+        start = time.perf_counter()
+        for entity in entities:
+            funct(entity)
+        samples.append((time.perf_counter() - start) * 1_000_000 / len(entities))
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--pages", type=int, default=20)
+    args = parser.parse_args()
+
+    apps, app_configs, threads = _rows(args.rows)
+    print(f"rows per page: {args.rows}  pages: {args.pages}  (median us per row)")
+    for label, entities, type_class, serializer in [
+        ("AppModel", apps, AppType, app_serializer),
+        ("AppConfigModel", app_configs, AppConfigType, app_config_serializer),
+        ("ThreadModel", threads, ThreadType, thread_serializer),
+    ]:
+        generic = _measure(
+            lambda entity: type_class(
+                **Serializer.json_normalize(entity.__dict__["attribute_values"])
+            ),
+            entities,
+            args.pages,
+        )
+        specialized = _measure(serializer.to_type, entities, args.pages)
+        print(
+            f"{label:<16} json_normalize {generic:>8.2f}us  "
+            f"ModelSerializer {specialized:>8.2f}us  "
+            f"speedup {generic / specialized:>5.1f}x  "
+            f"(1k-row page: {generic:.1f}ms -> {specialized:.1f}ms)"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
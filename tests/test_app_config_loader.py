@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function
+
+__author__ = "bibow"
+
+import pytest
+
+from app_core_engine.handlers.cache import MISSING
+from app_core_engine.models import utils
+from app_core_engine.models.app_config import AppConfigModel
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    utils.app_config_cache.clear()
+    yield
+    utils.app_config_cache.clear()
+
+
+def _batch_get(monkeypatch, rows, during=None):
+    calls = []
+
+    def batch_get(keys):
+        calls.append(sorted(keys))
+        if during is not None:
+            during()
+        return [
+            AppConfigModel(platform, app_id, configuration=rows[(platform, app_id)])
+            for platform, app_id in keys
+            if (platform, app_id) in rows
+        ]
+
+    monkeypatch.setattr(AppConfigModel, "batch_get", batch_get)
+    return calls
+
+
+def test_primed_keys_are_read_in_one_batch(monkeypatch):
+    calls = _batch_get(monkeypatch, {("shopify", "app-1"): {"a": 1}})
+    loader = utils.AppConfigLoader()
+    loader.prime("shopify", "app-1")
+    loader.prime("shopify", "app-2")
+
+    assert loader.load("shopify", "app-1")["configruation"] == {"a": 1}
+    assert loader.load("shopify", "app-2") is None
+    assert calls == [[("shopify", "app-1"), ("shopify", "app-2")]]
+    # Later requests are served from the process cache, misses included.
+    assert utils.AppConfigLoader().load("shopify", "app-2") is None
+    assert len(calls) == 1
+
+
+def test_a_write_during_the_batch_read_is_not_overwritten(monkeypatch):
+    key = ("shopify", "app-1")
+    # insert_update_app_config invalidates the key after its write.
+    _batch_get(
+        monkeypatch,
+        {key: {"a": "old"}},
+        during=lambda: utils.app_config_cache.invalidate(key),
+    )
+
+    assert utils.AppConfigLoader().load(*key)["configruation"] == {"a": "old"}
+    assert utils.app_config_cache.get(key) is MISSING
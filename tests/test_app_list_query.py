@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function
+
+__author__ = "bibow"
+
+import inspect
+import itertools
+
+import pytest
+from pynamodb.expressions.condition import Condition
+from pynamodb.expressions.operand import Path
+
+from app_core_engine.models.app import AppModel, resolve_app_list
+
+# resolve_app_list without its decorators: returns (inquiry_funct, count_funct, args).
+build_app_list_query = inspect.unwrap(resolve_app_list)
+
+
+def _attribute_names(condition):
+    names = set()
+    if condition is None:
+        return names
+    for value in condition.values:
+        if isinstance(value, Path):
+            names.add(value.path[0])
+        elif isinstance(value, Condition):
+            names |= _attribute_names(value)
+    return names
+
+
+def _key_names(inquiry_funct):
+    if inquiry_funct.__name__ == "scan":
+        return set()
+    owner = inquiry_funct.__self__
+    if isinstance(owner, type):
+        return {owner._hash_keyname, owner._range_keyname}
+    return {
+        name
+        for name, attribute in owner.Meta.attributes.items()
+        if attribute.is_hash_key or attribute.is_range_key
+    }
+
+
+def _filter_condition(inquiry_funct, args):
+    if inquiry_funct.__name__ == "scan":
+        return args[0] if args else None
+    return args[2] if len(args) > 2 else None
+
+
+@pytest.mark.parametrize(
+    "app_id, target_id, platform, statuses",
+    list(
+        itertools.product(
+            [None, "app-1"],
+            [None, "store-1"],
+            [None, "shopify"],
+            [None, ["installed"], ["installed", "uninstalled"]],
+        )
+    ),
+)
+def test_filters_never_reference_key_attributes(app_id, target_id, platform, statuses):
+    # DynamoDB rejects a FilterExpression on a key attribute of the queried index.
+    kwargs = {
+        name: value
+        for name, value in [
+            ("app_id", app_id),
+            ("target_id", target_id),
+            ("platform", platform),
+            ("statuses", statuses),
+        ]
+        if value is not None
+    }
+    inquiry_funct, _, args = build_app_list_query(None, **kwargs)
+
+    filter_condition = _filter_condition(inquiry_funct, args)
+    assert not _attribute_names(filter_condition) & _key_names(inquiry_funct)
+
+
+@pytest.mark.parametrize("key", ["target_id", "platform"])
+def test_several_statuses_fall_back_to_a_filtered_scan(key):
+    inquiry_funct, _, args = build_app_list_query(
+        None, **{key: "value", "statuses": ["installed", "uninstalled"]}
+    )
+
+    assert inquiry_funct == AppModel.scan
+    assert _attribute_names(args[0]) == {key, "status"}
+
+
+@pytest.mark.parametrize(
+    "key, index", [("target_id", "target_id-status-index"), ("platform", "platform-status-index")]
+)
+def test_one_status_is_a_key_condition(key, index):
+    inquiry_funct, _, args = build_app_list_query(
+        None, **{key: "value", "statuses": ["installed"]}
+    )
+
+    assert inquiry_funct.__self__.Meta.index_name == index
+    assert _attribute_names(args[1]) == {"status"}
+    assert len(args) == 2
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function
+
+__author__ = "bibow"
+
+import pendulum
+
+from app_core_engine.models import utils
+from app_core_engine.models.thread import ThreadModel
+
+NOW = pendulum.datetime(2024, 1, 1, tz="UTC")
+
+
+def _thread(thread_uuid, user_id="user-1"):
+    return ThreadModel(
+        "platform-1", thread_uuid, app_id="app-1", user_id=user_id, created_at=NOW
+    )
+
+
+def test_duplicate_keys_in_one_batch_are_errors(monkeypatch):
+    calls = []
+    monkeypatch.setattr(
+        utils,
+        "_batch_write_page",
+        lambda model_class, put_items: calls.append(put_items) or {},
+    )
+
+    errors = utils._batch_write(
+        ThreadModel, [_thread("t1"), _thread("t2"), _thread("t1", user_id="user-2")]
+    )
+
+    assert errors == [None, None, "Duplicate key in the same batch."]
+    assert len(calls) == 1
+    assert [item["thread_uuid"]["S"] for item in calls[0]] == ["t1", "t2"]
+    assert calls[0][0]["user_id"]["S"] == "user-1"
+
+
+def test_same_key_in_separate_batches_is_written(monkeypatch):
+    calls = []
+    monkeypatch.setattr(
+        utils,
+        "_batch_write_page",
+        lambda model_class, put_items: calls.append(put_items) or {},
+    )
+    entities = [_thread(f"t{index}") for index in range(utils.BATCH_WRITE_LIMIT)]
+
+    errors = utils._batch_write(ThreadModel, entities + [_thread("t0")])
+
+    assert errors == [None] * (utils.BATCH_WRITE_LIMIT + 1)
+    assert [len(put_items) for put_items in calls] == [utils.BATCH_WRITE_LIMIT, 1]
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function
+
+__author__ = "bibow"
+
+import json
+
+import pytest
+
+from app_core_engine.handlers.bulk_import import import_rows
+from app_core_engine.models import counter, utils
+
+
+@pytest.fixture
+def source(tmp_path):
+    path = tmp_path / "threads.ndjson"
+    with open(path, "w") as rows:
+        for number in range(4):
+            rows.write(
+                json.dumps(
+                    {
+                        "platform": "shopify",
+                        "thread_uuid": f"thread-{number}",
+                        "app_id": "app-1",
+                        "user_id": f"user-{number // 2}",
+                    }
+                )
+                + "\n"
+            )
+    return str(path)
+
+
+@pytest.fixture
+def invalidated(monkeypatch):
+    monkeypatch.setattr(counter.Counters, "enabled", True)
+    calls = []
+    monkeypatch.setattr(counter, "invalidate_counters", lambda keys: calls.append(set(keys)))
+    return calls
+
+
+def test_counters_are_invalidated_before_a_crash_and_on_resume(
+    monkeypatch, tmp_path, source, invalidated
+):
+    checkpoint_path = str(tmp_path / "checkpoint.json")
+    written = []
+
+    def crash_on_second_chunk(model_class, entities, pacer=None):
+        if written:
+            raise RuntimeError("Lambda timed out")
+        written.extend(entity.thread_uuid for entity in entities)
+        return [None] * len(entities)
+
+    monkeypatch.setattr(utils, "_batch_write", crash_on_second_chunk)
+    with pytest.raises(RuntimeError):
+        import_rows(
+            "threads", source, checkpoint_path=checkpoint_path, chunk_size=2, workers=1
+        )
+
+    # The chunk written before the crash already invalidated its counters.
+    assert written == ["thread-0", "thread-1"]
+    assert invalidated == [
+        {
+            counter.counter_key("threads:platform", "shopify"),
+            counter.counter_key("threads:platform,user_id", "shopify", "user-0"),
+        }
+    ]
+
+    monkeypatch.setattr(
+        utils, "_batch_write", lambda model_class, entities, pacer=None: [None] * len(entities)
+    )
+    result = import_rows(
+        "threads", source, checkpoint_path=checkpoint_path, chunk_size=2, workers=1
+    )
+
+    assert (result["skipped"], result["written"]) == (2, 4)
+    assert invalidated[1] == {
+        counter.counter_key("threads:platform", "shopify"),
+        counter.counter_key("threads:platform,user_id", "shopify", "user-1"),
+    }
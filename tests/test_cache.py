@@ -0,0 +1,241 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function
+
+__author__ = "bibow"
+
+import threading
+import time
+import types
+
+import pytest
+
+from app_core_engine.handlers import cache as cache_module
+from app_core_engine.handlers.cache import MISSING, TTLCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """A settable monotonic clock for the cache module."""
+    now = [1000.0]
+    monkeypatch.setattr(
+        cache_module,
+        "time",
+        types.SimpleNamespace(monotonic=lambda: now[0], time=time.time),
+    )
+    return now
+
+
+def test_entries_expire_after_ttl(clock):
+    cache = TTLCache(ttl=10.0)
+    cache.set("key", "value")
+
+    clock[0] += 9.9
+    assert cache.get("key") == "value"
+    clock[0] += 0.1
+    assert cache.get("key") is MISSING
+    assert cache.get_stats()["size"] == 0
+
+
+def test_none_uses_the_negative_ttl(clock):
+    cache = TTLCache(ttl=60.0, negative_ttl=5.0)
+    cache.set("missing", None)
+    cache.set("found", "value")
+
+    clock[0] += 5.0
+    assert cache.get("missing") is MISSING
+    assert cache.get("found") == "value"
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = TTLCache(max_size=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+
+    assert cache.get("b") is MISSING
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.get_stats()["evictions"] == 1
+
+
+def test_configure_evicts_down_to_max_size():
+    cache = TTLCache(max_size=3)
+    for key in "abc":
+        cache.set(key, key)
+    cache.configure(max_size=1)
+
+    assert cache.get("c") == "c"
+    assert cache.get_stats()["size"] == 1
+
+
+def test_get_or_load_reloads_after_expiry(clock):
+    cache = TTLCache(ttl=10.0, negative_ttl=1.0)
+    values = iter([None, "value"])
+    calls = []
+
+    def loader():
+        calls.append(1)
+        return next(values)
+
+    assert cache.get_or_load("key", loader) is None
+    assert cache.get_or_load("key", loader) is None
+    assert len(calls) == 1
+
+    clock[0] += 1.0
+    assert cache.get_or_load("key", loader) == "value"
+    assert cache.get_or_load("key", loader) == "value"
+    assert len(calls) == 2
+
+
+def _start_loads(cache, loader, callers):
+    results, threads = [], []
+    for _ in range(callers):
+
+        def call():
+            try:
+                results.append(cache.get_or_load("key", loader))
+            except Exception as e:
+                results.append(e)
+
+        thread = threading.Thread(target=call)
+        thread.start()
+        threads.append(thread)
+    return results, threads
+
+
+def _wait_for(condition):
+    deadline = time.monotonic() + 5
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.001)
+
+
+def test_concurrent_misses_share_one_load():
+    cache = TTLCache()
+    release = threading.Event()
+    calls = []
+
+    def loader():
+        calls.append(1)
+        release.wait(5)
+        return "value"
+
+    results, threads = _start_loads(cache, loader, 8)
+    # Every caller has missed and is now either loading or waiting.
+    _wait_for(lambda: cache.get_stats()["misses"] == 8)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert results == ["value"] * 8
+    assert len(calls) == 1
+    assert cache.get("key") == "value"
+
+
+def test_a_failed_load_is_shared_and_not_cached():
+    cache = TTLCache()
+    release = threading.Event()
+
+    def loader():
+        release.wait(5)
+        raise RuntimeError("throttled")
+
+    results, threads = _start_loads(cache, loader, 4)
+    _wait_for(lambda: cache.get_stats()["misses"] == 4)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert len(results) == 4
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert cache.get("key") is MISSING
+    assert cache.get_or_load("key", lambda: "value") == "value"
+
+
+@pytest.mark.parametrize("invalidate", [lambda cache: cache.invalidate("key"), TTLCache.clear])
+def test_a_load_overlapping_an_invalidation_is_not_cached(invalidate):
+    cache = TTLCache()
+    loading, release = threading.Event(), threading.Event()
+
+    def loader():
+        loading.set()
+        release.wait(5)
+        return "old"
+
+    results, threads = _start_loads(cache, loader, 1)
+    loading.wait(5)
+    invalidate(cache)
+    release.set()
+    threads[0].join(5)
+
+    assert results == ["old"]
+    assert cache.get("key") is MISSING
+    assert cache.get_or_load("key", lambda: "new") == "new"
+
+
+def test_snapshot_round_trip(tmp_path):
+    cache = TTLCache(ttl=60.0)
+    cache.set(("shopify", "app-1"), {"configuration": {"a": 1}})
+    cache.set(("shopify", "app-2"), None)
+    path = str(tmp_path / "cache.json")
+    cache.save_snapshot(path)
+
+    restored = TTLCache(ttl=60.0)
+    assert restored.load_snapshot(path) == 2
+    assert restored.get(("shopify", "app-1")) == {"configuration": {"a": 1}}
+    assert restored.get(("shopify", "app-2")) is None
+    assert TTLCache().load_snapshot(str(tmp_path / "absent.json")) == 0
+
+
+def test_get_or_load_many_loads_only_the_missing_keys():
+    cache = TTLCache()
+    cache.set("a", 1)
+    calls = []
+
+    def loader(keys):
+        calls.append(sorted(keys))
+        return {"b": 2}
+
+    assert cache.get_or_load_many(["a", "b", "c"], loader) == {"a": 1, "b": 2, "c": None}
+    assert calls == [["b", "c"]]
+    assert cache.get_or_load_many(["b", "c"], loader) == {"b": 2, "c": None}
+    assert len(calls) == 1
+
+
+def test_get_or_load_many_does_not_cache_a_key_invalidated_while_loading():
+    cache = TTLCache()
+
+    def loader(keys):
+        # A write lands between the read and the cache write-back.
+        cache.invalidate("a")
+        return {key: "old" for key in keys}
+
+    assert cache.get_or_load_many(["a", "b"], loader) == {"a": "old", "b": "old"}
+    assert cache.get("a") is MISSING
+    assert cache.get("b") == "old"
+
+
+def test_get_or_load_many_waits_for_keys_another_caller_is_loading():
+    cache = TTLCache()
+    release = threading.Event()
+
+    def slow_loader():
+        release.wait(5)
+        return "a-value"
+
+    results, threads = _start_loads(cache, slow_loader, 1)
+    _wait_for(lambda: cache.get_stats()["misses"] == 1)
+    batches = []
+
+    def batch_loader(keys):
+        batches.append(sorted(keys))
+        release.set()
+        return {key: f"{key}-value" for key in keys}
+
+    assert cache.get_or_load_many(["key", "b"], batch_loader) == {
+        "key": "a-value",
+        "b": "b-value",
+    }
+    threads[0].join(5)
+    assert batches == [["b"]]
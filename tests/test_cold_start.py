@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function
+
+__author__ = "bibow"
+
+import json
+import os
+import subprocess
+import sys
+
+# Run in a fresh interpreter; modules loaded by the silvaengine_utility
+# dependency itself are not ours to defer, so they are the baseline.
+SCRIPT = """
+import json, sys
+import silvaengine_utility
+baseline = set(sys.modules)
+from app_core_engine import deploy
+deploy()
+print(json.dumps(sorted(set(sys.modules) - baseline)))
+"""
+
+
+def test_deploy_does_not_load_the_models_or_aws_libraries():
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [root, env.get("PYTHONPATH")]))
+    output = subprocess.run(
+        [sys.executable, "-c", SCRIPT], env=env, check=True, capture_output=True, text=True
+    ).stdout
+    loaded = json.loads(output.splitlines()[-1])
+
+    deferred = (
+        "app_core_engine.models",
+        "app_core_engine.schema",
+        "boto3",
+        "botocore",
+        "pynamodb",
+        "tenacity",
+    )
+    assert [name for name in loaded if name.startswith(deferred)] == []
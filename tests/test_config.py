@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function
+
+__author__ = "bibow"
+
+import pytest
+
+from app_core_engine.handlers import config
+from app_core_engine.handlers.config import Config
+
+
+@pytest.fixture
+def fetches(monkeypatch):
+    calls = []
+
+    def fetch_graphql_schema(context, funct, aws_lambda=None):
+        calls.append(funct)
+        return {"funct": funct}
+
+    monkeypatch.setattr(config.Graphql, "fetch_graphql_schema", fetch_graphql_schema)
+    monkeypatch.setattr(Config, "get_aws_lambda", classmethod(lambda cls: None))
+    monkeypatch.setattr(Config, "schemas", {})
+    monkeypatch.setattr(Config, "schema_snapshot_path", None)
+    Config._schema_cache.clear()
+    yield calls
+    Config._schema_cache.clear()
+
+
+def test_fetched_schemas_are_cached(fetches):
+    assert Config.fetch_graphql_schema({}, "remote") == {"funct": "remote"}
+    assert Config.fetch_graphql_schema({}, "remote") == {"funct": "remote"}
+    assert fetches == ["remote"]
+
+
+def test_schemas_stays_a_dict_of_pinned_schemas(fetches):
+    assert isinstance(Config.schemas, dict)
+    Config.schemas["pinned"] = {"funct": "local"}
+
+    assert Config.fetch_graphql_schema({}, "pinned") == {"funct": "local"}
+    assert Config.schemas.get("missing") is None
+    assert fetches == []
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function
+
+__author__ = "bibow"
+
+import types
+
+import pytest
+from botocore.exceptions import ClientError
+from pynamodb.exceptions import PutError
+
+from app_core_engine.models import counter
+from app_core_engine.models.counter import CounterModel, Counters, counted, counter_key
+
+
+def _put_error(code):
+    return PutError(
+        "Failed to put item",
+        cause=ClientError({"Error": {"Code": code, "Message": code}}, "PutItem"),
+    )
+
+
+@pytest.fixture
+def counters(monkeypatch):
+    """Counters enabled, with the counter table replaced by a dict."""
+    monkeypatch.setattr(Counters, "enabled", True)
+    table, saves = {}, []
+
+    def save(self, condition=None):
+        saves.append(self.key)
+        table[self.key] = types.SimpleNamespace(total=self.total)
+
+    monkeypatch.setattr(counter, "_get_counter", table.get)
+    monkeypatch.setattr(CounterModel, "save", save)
+    return table, saves
+
+
+def _count_funct(total):
+    calls = []
+
+    def count(*args, **kwargs):
+        calls.append(args)
+        return total
+
+    return count, calls
+
+
+def test_total_does_not_shadow_model_count():
+    assert "count" not in CounterModel.get_attributes()
+    assert callable(CounterModel.count)
+    assert CounterModel.total.attr_name == "count"
+
+
+def test_counter_keys_are_distinct_per_partition():
+    assert counter_key("apps:app_id", "a1") != counter_key("apps:app_id", "a2")
+    assert counter_key("apps:target_id,status", "t1", "installed") == (
+        'apps:target_id,status#["t1","installed"]'
+    )
+
+
+def test_disabled_counters_pass_through(monkeypatch):
+    monkeypatch.setattr(Counters, "enabled", False)
+    count, calls = _count_funct(7)
+
+    assert counted("apps:app_id", ["a1"], count)("a1") == 7
+    assert calls == [("a1",)]
+
+
+def test_a_missing_counter_is_initialized_from_a_real_count(counters):
+    table, saves = counters
+    count, calls = _count_funct(7)
+    total = counted("apps:app_id", ["a1"], count)
+
+    assert total("a1") == 7
+    assert total("a1") == 7
+    assert len(calls) == 1
+    assert saves == [counter_key("apps:app_id", "a1")]
+
+
+def test_an_existing_counter_is_read_without_counting(counters):
+    table, _ = counters
+    table[counter_key("apps:app_id", "a1")] = types.SimpleNamespace(total=3)
+    count, calls = _count_funct(7)
+
+    assert counted("apps:app_id", ["a1"], count)("a1") == 3
+    assert calls == []
+
+
+def test_a_negative_counter_reads_as_zero(counters):
+    table, _ = counters
+    table[counter_key("apps:app_id", "a1")] = types.SimpleNamespace(total=-2)
+
+    assert counted("apps:app_id", ["a1"], _count_funct(7)[0])("a1") == 0
+
+
+def test_losing_the_initialization_race_returns_the_count(monkeypatch, counters):
+    def save(self, condition=None):
+        raise _put_error("ConditionalCheckFailedException")
+
+    monkeypatch.setattr(CounterModel, "save", save)
+
+    assert counted("apps:app_id", ["a1"], _count_funct(7)[0])("a1") == 7
+
+
+def test_other_initialization_errors_are_raised(monkeypatch, counters):
+    def save(self, condition=None):
+        raise _put_error("ValidationException")
+
+    monkeypatch.setattr(CounterModel, "save", save)
+
+    with pytest.raises(PutError):
+        counted("apps:app_id", ["a1"], _count_funct(7)[0])("a1")
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function
+
+__author__ = "bibow"
+
+import logging
+
+import pendulum
+import pytest
+
+mock_aws = pytest.importorskip("moto").mock_aws
+
+from app_core_engine.main import AppCoreEngine
+
+THREAD_LIST = """
+    query threadList($platform: String!, $appId: String, $after: String) {
+        threadList(platform: $platform, appId: $appId, first: 2, after: $after) {
+            endCursor hasNextPage threadList { threadUuid }
+        }
+    }
+"""
+APP_LIST = """
+    query appList($targetId: String, $platform: String, $after: String) {
+        appList(targetId: $targetId, platform: $platform, first: 2, after: $after) {
+            endCursor hasNextPage appList { appId }
+        }
+    }
+"""
+
+
+@pytest.fixture
+def schema(monkeypatch):
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "us-east-1")
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+    with mock_aws():
+        from app_core_engine.models.app import AppModel, create_app_table
+        from app_core_engine.models.thread import ThreadModel, create_thread_table
+
+        create_app_table(logging.getLogger(__name__))
+        create_thread_table(logging.getLogger(__name__))
+        now = pendulum.now("UTC")
+        # The filter drops the first row, so the first page returns one app
+        # and the second page stops in the middle of what DynamoDB returned.
+        for number in range(6):
+            AppModel(
+                f"app-{number}",
+                "target-1",
+                platform="shopify" if number else "bigcommerce",
+                scope="read",
+                user_id="user-1",
+                data={},
+                status="installed",
+                created_at=now,
+                updated_at=now,
+            ).save()
+            ThreadModel(
+                "shopify" if number else "bigcommerce",
+                f"thread-{number}",
+                app_id="app-1",
+                user_id="user-1",
+                created_at=now.add(seconds=number),
+            ).save()
+        yield AppCoreEngine.build_graphql_schema()
+
+
+def _execute(schema, query, **variables):
+    result = schema.execute(
+        query,
+        variable_values=variables,
+        context_value={"logger": logging.getLogger(__name__), "setting": {}},
+    )
+    assert result.errors is None, result.errors
+    return list(result.data.values())[0]
+
+
+def _read_all(schema, query, list_field, id_field, **variables):
+    ids, after = [], None
+    for _ in range(6):
+        page = _execute(schema, query, after=after, **variables)
+        ids += [row[id_field] for row in page[list_field]]
+        if not page["hasNextPage"]:
+            break
+        after = page["endCursor"]
+    return sorted(ids)
+
+
+def test_filtered_app_index_query_pages_with_a_projection(schema):
+    # target-id-status-index, filtered on platform; status is not selected.
+    app_ids = _read_all(
+        schema, APP_LIST, "appList", "appId", targetId="target-1", platform="shopify"
+    )
+
+    assert app_ids == ["app-1", "app-2", "app-3", "app-4", "app-5"]
+
+
+def test_filtered_thread_index_query_pages_with_a_projection(schema):
+    # app_id-created_at-index, filtered on platform; createdAt is not selected.
+    thread_uuids = _read_all(
+        schema, THREAD_LIST, "threadList", "threadUuid", platform="shopify", appId="app-1"
+    )
+
+    assert thread_uuids == ["thread-1", "thread-2", "thread-3", "thread-4", "thread-5"]
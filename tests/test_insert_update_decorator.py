@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function
+
+__author__ = "bibow"
+
+import pytest
+
+from app_core_engine.models.utils import insert_update_decorator
+
+KEYS = {"hash_key": "platform", "range_key": "item_id"}
+
+
+class Reads:
+    def __init__(self, rows):
+        self.rows = rows
+        self.gets = []
+        self.model_reads = []
+
+    def get(self, platform, item_id):
+        self.gets.append((platform, item_id))
+        return self.rows.get((platform, item_id))
+
+    def model(self, platform, item_id):
+        self.model_reads.append((platform, item_id))
+        return self.rows[(platform, item_id)]
+
+
+def _resolver(reads, body):
+    return insert_update_decorator(
+        keys=KEYS,
+        get_funct=reads.get,
+        model_funct=reads.model,
+        type_funct=lambda info, entity: entity,
+        range_key_required=True,
+    )(body)
+
+
+def test_an_update_reads_the_existing_item_once():
+    reads = Reads({("shopify", "1"): {"version": 1}})
+    seen = []
+
+    def update(info, **kwargs):
+        seen.append(kwargs["entity"])
+        reads.rows[("shopify", "1")] = {"version": 2}
+
+    assert _resolver(reads, update)(None, platform="shopify", item_id="1") == {"version": 2}
+    assert seen == [{"version": 1}]
+    assert reads.gets == [("shopify", "1")]
+    # Only the read of the written item goes to model_funct.
+    assert reads.model_reads == [("shopify", "1")]
+
+
+def test_an_insert_gets_no_entity():
+    reads = Reads({})
+
+    def insert(info, **kwargs):
+        assert kwargs.get("entity") is None
+        reads.rows[("shopify", "1")] = {"version": 1}
+
+    assert _resolver(reads, insert)(None, platform="shopify", item_id="1") == {"version": 1}
+    assert reads.gets == [("shopify", "1")]
+
+
+def test_nested_calls_keep_their_own_items():
+    reads = Reads({("shopify", "1"): {"id": "1"}, ("shopify", "2"): {"id": "2"}})
+    seen = []
+
+    def inner(info, **kwargs):
+        seen.append(kwargs["entity"]["id"])
+
+    inner_resolver = _resolver(reads, inner)
+
+    def outer(info, **kwargs):
+        # Another insert/update between the outer read and its entity use.
+        inner_resolver(None, platform="shopify", item_id="2")
+        seen.append(kwargs["entity"]["id"])
+
+    _resolver(reads, outer)(None, platform="shopify", item_id="1")
+
+    assert seen == ["2", "1"]
+    assert sorted(reads.gets) == [("shopify", "1"), ("shopify", "2")]
+
+
+def test_a_failed_write_does_not_leak_the_item():
+    reads = Reads({("shopify", "1"): {"id": "1"}})
+
+    def failing(info, **kwargs):
+        raise RuntimeError("write failed")
+
+    with pytest.raises(RuntimeError):
+        _resolver(reads, failing)(None, platform="shopify", item_id="1")
+    reads.rows[("shopify", "1")] = {"id": "1", "changed": True}
+
+    # A later call reads again instead of reusing the earlier item.
+    assert _resolver(reads, lambda info, **kwargs: None)(
+        None, platform="shopify", item_id="1"
+    ) == {"id": "1", "changed": True}
+    assert len(reads.gets) == 2
@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function
+
+__author__ = "bibow"
+
+import base64
+
+import pytest
+
+from app_core_engine.models.pagination import decode_cursor, encode_cursor
+
+LAST_EVALUATED_KEY = {"platform": {"S": "shopify"}, "app_id": {"S": "app-1"}}
+
+
+def _encode(raw):
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def test_cursor_round_trip():
+    cursor = encode_cursor(LAST_EVALUATED_KEY)
+
+    assert isinstance(cursor, str)
+    assert decode_cursor(cursor) == LAST_EVALUATED_KEY
+
+
+@pytest.mark.parametrize("cursor", [None, ""])
+def test_no_cursor_starts_from_the_beginning(cursor):
+    assert decode_cursor(cursor) is None
+    assert encode_cursor(None) is None
+
+
+@pytest.mark.parametrize(
+    "cursor",
+    [
+        "not base64!",
+        "abc",  # Bad padding.
+        _encode(b"not json"),
+        _encode(b"\xff\xfe\xfd"),  # Not UTF-8.
+        _encode(b"[1, 2]"),
+        _encode(b'"app-1"'),
+        _encode(b"null"),
+        encode_cursor(LAST_EVALUATED_KEY)[:-4],
+    ],
+)
+def test_tampered_cursor_is_rejected(cursor):
+    with pytest.raises(Exception, match="Invalid cursor"):
+        decode_cursor(cursor)
@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function
+
+__author__ = "bibow"
+
+import pytest
+from botocore.exceptions import ClientError, EndpointConnectionError, ReadTimeoutError
+from pynamodb.exceptions import DoesNotExist, GetError, PutError, QueryError
+
+from app_core_engine.handlers.retry_policy import (
+    RetryPolicy,
+    dynamodb_retry,
+    is_transient_error,
+)
+
+
+def _client_error(code):
+    return ClientError({"Error": {"Code": code, "Message": code}}, "PutItem")
+
+
+@pytest.mark.parametrize(
+    "exception",
+    [
+        _client_error("ProvisionedThroughputExceededException"),
+        _client_error("ThrottlingException"),
+        _client_error("InternalServerError"),
+        PutError("Failed to put item", cause=_client_error("RequestLimitExceeded")),
+        QueryError("Failed to query items", cause=_client_error("ServiceUnavailable")),
+        EndpointConnectionError(endpoint_url="https://dynamodb.us-east-1.amazonaws.com"),
+        ReadTimeoutError(endpoint_url="https://dynamodb.us-east-1.amazonaws.com"),
+        GetError(
+            "Failed to get item",
+            cause=ReadTimeoutError(endpoint_url="https://dynamodb.us-east-1.amazonaws.com"),
+        ),
+    ],
+)
+def test_transient_errors(exception):
+    assert is_transient_error(exception)
+
+
+@pytest.mark.parametrize(
+    "exception",
+    [
+        _client_error("ValidationException"),
+        _client_error("ConditionalCheckFailedException"),
+        _client_error("ResourceNotFoundException"),
+        PutError("Failed to put item", cause=_client_error("ConditionalCheckFailedException")),
+        PutError("Failed to put item"),
+        DoesNotExist(),
+        ValueError("bad input"),
+    ],
+)
+def test_permanent_errors(exception):
+    assert not is_transient_error(exception)
+
+
+def test_the_cause_chain_is_followed():
+    try:
+        try:
+            raise _client_error("ThrottlingException")
+        except ClientError as e:
+            raise RuntimeError("wrapped") from e
+    except RuntimeError as e:
+        assert is_transient_error(e)
+
+
+def test_a_cause_cycle_terminates():
+    first, second = RuntimeError("first"), RuntimeError("second")
+    first.__cause__, second.__cause__ = second, first
+
+    assert not is_transient_error(first)
+
+
+@pytest.fixture
+def fast_retries(monkeypatch):
+    monkeypatch.setattr(RetryPolicy, "base_delay", 0.0)
+    monkeypatch.setattr(RetryPolicy, "max_delay", 0.0)
+    monkeypatch.setattr(RetryPolicy, "max_attempts", 3)
+    monkeypatch.setattr(RetryPolicy, "stats", {})
+
+
+def test_transient_errors_are_retried_until_they_clear(fast_retries):
+    calls = []
+
+    @dynamodb_retry
+    def flaky():
+        calls.append(1)
+        if len(calls) < 3:
+            raise _client_error("ThrottlingException")
+        return "ok"
+
+    assert flaky() == "ok"
+    assert len(calls) == 3
+    assert RetryPolicy.get_stats()["flaky"] == {"calls": 1, "retries": 2, "exhausted": 0}
+
+
+def test_retries_stop_after_max_attempts(fast_retries):
+    calls = []
+
+    @dynamodb_retry
+    def throttled():
+        calls.append(1)
+        raise _client_error("ThrottlingException")
+
+    with pytest.raises(ClientError):
+        throttled()
+    assert len(calls) == RetryPolicy.max_attempts
+    assert RetryPolicy.get_stats()["throttled"]["exhausted"] == 1
+
+
+def test_permanent_errors_are_not_retried(fast_retries):
+    calls = []
+
+    @dynamodb_retry
+    def invalid():
+        calls.append(1)
+        raise _client_error("ValidationException")
+
+    with pytest.raises(ClientError):
+        invalid()
+    assert len(calls) == 1